@@ -1,6 +1,6 @@
 from flask import Flask, render_template, Response, jsonify
-import cv2
 from crowd_counter import CrowdCounter
+from camera_worker import CameraWorker, CameraWorkerPool, mjpeg_stream
 import threading
 
 app = Flask(__name__)
@@ -50,29 +50,22 @@ crowd_data = {b: 0 for b in cameras.keys()}
 data_lock = threading.Lock()
 
 
-# --- Video streaming generator ---
-def gen_frames(building_id, camera_source):
-    cap = cv2.VideoCapture(camera_source)
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
+# --- Per-frame processing for the shared camera workers ---
+def process_frame(building_id, frame, frame_index):
+    # YOLO people detection
+    count, annotated_frame = crowd_counter.count_people(frame)
 
-        # YOLO people detection
-        count, annotated_frame = crowd_counter.count_people(frame)
-
-        # Update crowd count safely
-        with data_lock:
-            crowd_data[building_id] = count
+    # Update crowd count safely
+    with data_lock:
+        crowd_data[building_id] = count
 
-        # Encode frame for streaming
-        _, buffer = cv2.imencode('.jpg', annotated_frame)
-        frame_bytes = buffer.tobytes()
+    return count, annotated_frame
 
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
 
-    cap.release()
+# --- One capture + inference loop per camera, shared by all viewers ---
+camera_workers = CameraWorkerPool(
+    lambda building_id: CameraWorker(building_id, cameras[building_id][1], process_frame,
+                                     frame_interval=0))
 
 
 # --- Routes ---
@@ -85,7 +78,7 @@ def index():
 def video_feed(building_id):
     if building_id not in cameras:
         return "Invalid building ID", 404
-    return Response(gen_frames(building_id, cameras[building_id][1]),
+    return Response(mjpeg_stream(camera_workers.get(building_id)),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
@@ -1,8 +1,12 @@
-from flask import Flask, render_template, Response, jsonify
+from flask import Flask, render_template, Response, jsonify, request
 import cv2
 from crowd_counter import CrowdCounter
+from camera_worker import CameraWorker, CameraWorkerPool, mjpeg_stream
+from mjpeg_broadcaster import stream_variant
+from connection_supervisor import ConnectionSupervisor
+from motion_gate import MotionGate
+from live_updates import LiveUpdateHub
 import threading
-import time
 
 app = Flask(__name__)
 
@@ -50,145 +54,68 @@ crowd_data = {b: 0 for b in cameras.keys()}
 # --- Thread-safe lock for updating crowd_data ---
 data_lock = threading.Lock()
 
+# --- Push count changes to dashboards over Server-Sent Events ---
+live_updates = LiveUpdateHub(heartbeat=15.0)
+
 # --- Connection retry settings ---
-MAX_RETRY_ATTEMPTS = 3
-RETRY_DELAY = 2  # seconds
+MAX_RETRY_ATTEMPTS = 3  # failures in a row before a camera is reported offline (it is still retried)
+RETRY_DELAY = 2  # seconds, doubled after each failure up to MAX_RETRY_DELAY
+MAX_RETRY_DELAY = 60
+
+# Opens all cameras concurrently off the capture threads, with jittered backoff
+camera_supervisor = ConnectionSupervisor(base_delay=RETRY_DELAY, max_delay=MAX_RETRY_DELAY,
+                                         offline_after=MAX_RETRY_ATTEMPTS)
+
+# --- Skip YOLO while a camera's scene is unchanged ---
+motion_gate = MotionGate(heartbeat=30.0)
+last_detections = {}
 
-# --- Enhanced video streaming generator with RTSP support ---
-def gen_frames(building_id, camera_source):
-    """Generate video frames with people counting"""
-    retry_count = 0
+# --- Per-frame processing for the shared camera workers ---
+def process_frame(building_id, frame, frame_index):
+    """Run people counting and overlays on one frame of a camera worker"""
+    camera_source = cameras[building_id][1]
     
-    while retry_count < MAX_RETRY_ATTEMPTS:
-        cap = None
-        try:
-            # Initialize video capture
-            cap = cv2.VideoCapture(camera_source)
-            
-            # Configure settings based on source type
-            if isinstance(camera_source, str) and camera_source.startswith('rtsp://'):
-                print(f"Connecting to RTSP stream for {building_id}: {camera_source}")
-                # RTSP specific settings for better performance
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                cap.set(cv2.CAP_PROP_FPS, 15)
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                # Set timeout for RTSP
-                cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 5000)
-                cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, 5000)
-            
-            # Test if camera is accessible
-            if not cap.isOpened():
-                print(f"Failed to open camera for {building_id}, attempt {retry_count + 1}")
-                if cap:
-                    cap.release()
-                retry_count += 1
-                time.sleep(RETRY_DELAY)
-                continue
-            
-            print(f"Successfully connected to {building_id} camera")
-            consecutive_failures = 0
-            
-            while True:
-                success, frame = cap.read()
-                
-                if not success:
-                    consecutive_failures += 1
-                    print(f"Failed to read frame from {building_id}, failure count: {consecutive_failures}")
-                    
-                    # If too many consecutive failures, try to reconnect
-                    if consecutive_failures >= 10:
-                        print(f"Too many failures for {building_id}, attempting reconnection...")
-                        break
-                    
-                    # Skip this frame and continue
-                    time.sleep(0.1)
-                    continue
-                
-                # Reset failure counter on successful frame
-                consecutive_failures = 0
-                
-                # Resize frame if too large (for better performance)
-                height, width = frame.shape[:2]
-                if width > 1280:
-                    scale = 1280 / width
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    frame = cv2.resize(frame, (new_width, new_height))
-                
-                # YOLO people detection
-                count, annotated_frame = crowd_counter.count_people(frame)
-                
-                # Add building info overlay
-                building_name = cameras[building_id][0]
-                cv2.putText(annotated_frame, f"Building: {building_id.upper()}", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                cv2.putText(annotated_frame, f"{building_name}", 
-                           (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-                cv2.putText(annotated_frame, f"People Count: {count}", 
-                           (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                
-                # Add connection type indicator
-                if isinstance(camera_source, str) and camera_source.startswith('rtsp://'):
-                    cv2.putText(annotated_frame, "RTSP LIVE", 
-                               (annotated_frame.shape[1] - 120, 30), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                
-                # Update crowd count safely
-                with data_lock:
-                    crowd_data[building_id] = count
-                
-                # Encode frame for streaming
-                encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
-                _, buffer = cv2.imencode('.jpg', annotated_frame, encode_param)
-                frame_bytes = buffer.tobytes()
-                
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                
-                # Small delay to prevent overwhelming the system
-                time.sleep(0.033)  # ~30 FPS
-        
-        except Exception as e:
-            print(f"Exception in {building_id} video stream: {str(e)}")
-            retry_count += 1
-            if cap:
-                cap.release()
-            
-            if retry_count < MAX_RETRY_ATTEMPTS:
-                print(f"Retrying connection for {building_id} in {RETRY_DELAY} seconds...")
-                time.sleep(RETRY_DELAY)
-            else:
-                print(f"Max retry attempts reached for {building_id}")
-                break
+    # Resize frame if too large (for better performance)
+    height, width = frame.shape[:2]
+    if width > 1280:
+        scale = 1280 / width
+        new_width = int(width * scale)
+        new_height = int(height * scale)
+        frame = cv2.resize(frame, (new_width, new_height))
     
-    # Cleanup
-    if cap:
-        cap.release()
+    # YOLO people detection, reusing the last result for static scenes
+    if motion_gate.should_infer(building_id, frame) or building_id not in last_detections:
+        last_detections[building_id] = crowd_counter.count(frame)
+    count, boxes = last_detections[building_id]
+    annotated_frame = crowd_counter.annotate(frame, boxes, count)
     
-    # If all retries failed, yield error frame
-    error_frame = create_error_frame(building_id, "Connection Failed")
-    _, buffer = cv2.imencode('.jpg', error_frame)
-    frame_bytes = buffer.tobytes()
-    yield (b'--frame\r\n'
-           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-
-def create_error_frame(building_id, error_message):
-    """Create an error frame when camera connection fails"""
-    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    # Add building info overlay
+    building_name = cameras[building_id][0]
+    cv2.putText(annotated_frame, f"Building: {building_id.upper()}", 
+               (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.putText(annotated_frame, f"{building_name}", 
+               (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+    cv2.putText(annotated_frame, f"People Count: {count}", 
+               (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
     
-    # Add error text
-    cv2.putText(frame, f"Building: {building_id.upper()}", 
-               (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-    cv2.putText(frame, error_message, 
-               (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-    cv2.putText(frame, "Please check camera connection", 
-               (50, 250), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+    # Add connection type indicator
+    if isinstance(camera_source, str) and camera_source.startswith('rtsp://'):
+        cv2.putText(annotated_frame, "RTSP LIVE", 
+                   (annotated_frame.shape[1] - 120, 30), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
     
-    return frame
+    # Update crowd count safely
+    with data_lock:
+        crowd_data[building_id] = count
+    live_updates.publish(building_id, get_building_crowd(building_id))
+    
+    return count, annotated_frame
 
-# Import numpy for error frame creation
-import numpy as np
+# --- One capture + inference loop per camera, shared by all viewers ---
+camera_workers = CameraWorkerPool(
+    lambda building_id: CameraWorker(building_id, cameras[building_id][1], process_frame,
+                                     supervisor=camera_supervisor,
+                                     max_failures=10, frame_interval=0.033, jpeg_quality=80))
 
 
 # --- Routes (SAME AS BEFORE) ---
@@ -204,7 +131,12 @@ def video_feed(building_id):
     camera_source = cameras[building_id][1]
     print(f"Starting video feed for {building_id} with source: {camera_source}")
     
-    return Response(gen_frames(building_id, camera_source),
+    # Optional ?width=&fps=&quality= for phones and remote viewers
+    try:
+        variant = stream_variant(request.args.get('width'), request.args.get('fps'), request.args.get('quality'))
+    except ValueError as e:
+        return str(e), 400
+    return Response(mjpeg_stream(camera_workers.get(building_id), variant),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 # --- Function to get building crowd info (SAME AS BEFORE) ---
@@ -236,6 +168,12 @@ def api_all_buildings():
         all_data.append(get_building_crowd(building_id))
     return jsonify(all_data)
 
+# --- Live crowd updates: snapshot on connect, then only changed buildings ---
+@app.route('/api/crowd_stream')
+def api_crowd_stream():
+    return Response(live_updates.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # --- New API for camera connection status ---
 @app.route('/api/camera_status')
 def camera_status():
@@ -250,6 +188,9 @@ def camera_status():
         }
     return jsonify(status)
 
+for building_id in cameras:
+    live_updates.publish(building_id, get_building_crowd(building_id))
+
 if __name__ == "__main__":
     print("=== Enhanced Crowd Counter System ===")
     print("Buildings with RTSP cameras:")
@@ -261,4 +202,5 @@ if __name__ == "__main__":
     print("Starting Flask server on http://0.0.0.0:5000")
     print("Dashboard available at: http://localhost:5000")
     
+    camera_supervisor.probe_all({building_id: source for building_id, (name, source) in cameras.items()})
     app.run(debug=True, host="0.0.0.0", port=5000, threaded=True)
\ No newline at end of file
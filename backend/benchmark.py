@@ -0,0 +1,235 @@
+"""Benchmark the camera pipeline stages on recorded clips.
+
+Example:
+    python benchmark.py clips/canteen.mp4 clips/theatre.mp4 \
+        --backend torch=models/yolov5s.pt --backend onnx=models/yolov5s.onnx \
+        --every 1 5 --width 640 960 --cameras 1 4 --json results/today.json \
+        --baseline results/last_week.json
+
+Every combination of backend, frame skip (--every), inference width and
+number of cameras is run through the same stages as a camera worker:
+read -> resize -> infer -> annotate -> JPEG encode. Camera i replays
+clip i % len(clips), looping, and the cameras' frames are inferred as one
+batch per tick like the batch inference engine does. For each stage the
+p50/p95/p99 latency in ms is reported, plus end-to-end frames per second,
+peak resident memory and the count output. Each configuration runs in a
+fresh process so peak memory is its own.
+
+Results are written as JSON; pass an earlier results file as --baseline
+to print the fps and p95 change of every matching configuration.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import platform
+import time
+
+import cv2
+import numpy as np
+
+STAGES = ('read', 'resize', 'infer', 'annotate', 'encode')
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process, or None where it is not available"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "n": 0}
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2),
+            "n": len(samples)}
+
+
+def open_clip(clip):
+    cap = cv2.VideoCapture(clip)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open {clip}")
+    return cap
+
+
+def read_frame(cap):
+    """Next frame of a clip, rewinding at the end so short clips can feed long runs"""
+    success, frame = cap.read()
+    if not success:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        success, frame = cap.read()
+    return frame if success else None
+
+
+def run_config(config):
+    """Replay the clips through one configuration and return its measurements"""
+    from crowd_counter import CrowdCounter
+
+    clips, cameras, every, width = config['clips'], config['cameras'], config['every'], config['width']
+    captures = [open_clip(clips[i % len(clips)]) for i in range(cameras)]
+    encode_params = [cv2.IMWRITE_JPEG_QUALITY, config['jpeg_quality']]
+
+    # Warm up on the shape the run will actually infer
+    first = read_frame(captures[0])
+    captures[0].set(cv2.CAP_PROP_POS_FRAMES, 0)
+    scale = min(1.0, width / first.shape[1])
+    warmup_size = (int(first.shape[0] * scale), int(first.shape[1] * scale))
+    counter = CrowdCounter(model_path=config['model'], backend=config['backend'],
+                           warmup_size=warmup_size, warmup_batch=cameras)
+
+    timings = {stage: [] for stage in STAGES}
+    timings['end_to_end'] = []
+    counts = [[] for _ in range(cameras)]
+    frames_read = frames_inferred = 0
+
+    start = time.perf_counter()
+    for tick in range(config['frames']):
+        tick_start = time.perf_counter()
+        frames = []
+        for cap in captures:
+            t = time.perf_counter()
+            frame = read_frame(cap)
+            timings['read'].append(time.perf_counter() - t)
+            frames.append(frame)
+        frames_read += cameras
+        if any(frame is None for frame in frames):
+            break
+
+        # Skipped ticks still pay for decoding, like a live worker
+        if tick % every:
+            continue
+
+        resized = []
+        for frame in frames:
+            t = time.perf_counter()
+            if frame.shape[1] > width:
+                frame = cv2.resize(frame, (width, int(frame.shape[0] * width / frame.shape[1])))
+            resized.append(frame)
+            timings['resize'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        results = counter.count_batch(resized)
+        timings['infer'].append(time.perf_counter() - t)
+        frames_inferred += len(resized)
+
+        for i, (frame, (count, boxes)) in enumerate(zip(resized, results)):
+            counts[i].append(count)
+            t = time.perf_counter()
+            frame = counter.annotate(frame, boxes, count)
+            timings['annotate'].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            cv2.imencode('.jpg', frame, encode_params)
+            timings['encode'].append(time.perf_counter() - t)
+
+        timings['end_to_end'].append(time.perf_counter() - tick_start)
+    elapsed = time.perf_counter() - start
+
+    for cap in captures:
+        cap.release()
+
+    all_counts = [count for camera_counts in counts for count in camera_counts]
+    return {
+        "config": {key: value for key, value in config.items() if key != 'clips'},
+        "startup_s": counter.startup_report.get('total_s'),
+        "elapsed_s": round(elapsed, 3),
+        "frames_read": frames_read,
+        "frames_inferred": frames_inferred,
+        "read_fps": round(frames_read / elapsed, 2) if elapsed > 0 else 0,
+        "inferred_fps": round(frames_inferred / elapsed, 2) if elapsed > 0 else 0,
+        "latency_ms": {stage: percentiles(samples) for stage, samples in timings.items()},
+        "peak_memory_mb": peak_memory_mb(),
+        "counts": {
+            "mean": round(float(np.mean(all_counts)), 2) if all_counts else None,
+            "min": min(all_counts, default=None),
+            "max": max(all_counts, default=None),
+            "per_camera": counts
+        }
+    }
+
+
+def config_key(config):
+    return (config['backend'], config['model'], config['every'], config['width'], config['cameras'])
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return {config_key(result['config']): result for result in json.load(f)['results']}
+
+
+def compare(results, baseline, baseline_path):
+    """Print fps and p95 changes against an earlier results file"""
+    print(f"\nAgainst {baseline_path}:")
+    print(f"{'backend':<12}{'every':>6}{'width':>7}{'cams':>6}{'fps':>10}{'e2e p95':>10}")
+    for result in results:
+        old = baseline.get(config_key(result['config']))
+        if old is None:
+            continue
+        config = result['config']
+        fps_change = result['inferred_fps'] / old['inferred_fps'] - 1 if old['inferred_fps'] else 0
+        old_p95 = old['latency_ms']['end_to_end']['p95']
+        new_p95 = result['latency_ms']['end_to_end']['p95']
+        p95_change = new_p95 / old_p95 - 1 if old_p95 and new_p95 else 0
+        print(f"{config['backend']:<12}{config['every']:>6}{config['width']:>7}{config['cameras']:>6}"
+              f"{fps_change:>+10.1%}{p95_change:>+10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clips', nargs='+', help="recorded video files")
+    parser.add_argument('--backend', action='append', metavar='NAME=MODEL',
+                        help="backend and model path (default torch=models/yolov5s.pt)")
+    parser.add_argument('--every', type=int, nargs='+', default=[1], help="infer every Nth frame")
+    parser.add_argument('--width', type=int, nargs='+', default=[640], help="inference width(s)")
+    parser.add_argument('--cameras', type=int, nargs='+', default=[1], help="simulated camera count(s)")
+    parser.add_argument('--frames', type=int, default=300, help="frames read per camera")
+    parser.add_argument('--jpeg-quality', type=int, default=85)
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--baseline', help="earlier --json results to compare against")
+    parser.add_argument('--no-isolate', action='store_true',
+                        help="run every configuration in this process (peak memory becomes cumulative)")
+    args = parser.parse_args()
+    # Read the baseline up front in case --json overwrites the same file
+    baseline = load_baseline(args.baseline) if args.baseline else None
+
+    backends = [spec.partition('=')[::2] for spec in (args.backend or ['torch=models/yolov5s.pt'])]
+    configs = [{"clips": args.clips, "backend": backend, "model": model, "every": every, "width": width,
+                "cameras": cameras, "frames": args.frames, "jpeg_quality": args.jpeg_quality}
+               for (backend, model), every, width, cameras
+               in itertools.product(backends, args.every, args.width, args.cameras)]
+
+    results = []
+    print(f"{'backend':<12}{'every':>6}{'width':>7}{'cams':>6}{'fps':>8}"
+          + "".join(f"{stage + ' p95':>14}" for stage in STAGES) + f"{'peak MB':>9}{'count':>7}")
+    for config in configs:
+        if args.no_isolate:
+            result = run_config(config)
+        else:
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                result = pool.apply(run_config, (config,))
+        results.append(result)
+
+        latency = result['latency_ms']
+        print(f"{config['backend']:<12}{config['every']:>6}{config['width']:>7}{config['cameras']:>6}"
+              f"{result['inferred_fps']:>8.1f}"
+              + "".join(f"{latency[stage]['p95'] if latency[stage]['p95'] is not None else '-':>14}"
+                        for stage in STAGES)
+              + f"{result['peak_memory_mb'] or '-':>9}{result['counts']['mean'] or 0:>7}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'), "host": platform.node(),
+                       "python": platform.python_version(), "opencv": cv2.__version__,
+                       "clips": args.clips, "results": results}, f, indent=2)
+
+    if args.baseline:
+        compare(results, baseline, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
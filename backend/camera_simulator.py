@@ -0,0 +1,249 @@
+"""Serve looping video files as local HTTP MJPEG cameras for scale testing.
+
+Example:
+    python camera_simulator.py clips/canteen.mp4 clips/theatre.mp4 --cameras 30 \
+        --fps 15 --width 1280 --height 720 --jitter 0.2 --drop-rate 0.02 \
+        --disconnect-every 120 --disconnect-for 10
+
+Camera i is served at http://127.0.0.1:<port>/cam/<i>/video (the same
+multipart MJPEG an IP Webcam /video URL returns, so cv2.VideoCapture
+opens it unchanged) and replays clip i % len(clips) from its own offset.
+Each clip is decoded, resized and JPEG-encoded once at startup and
+shared by all of its cameras, so serving 100 cameras costs little more
+than pacing the bytes. GET /stats reports per-camera counters.
+
+Point the app at the simulator with the camera registry profile:
+    CAMERA_PROFILE=simulator SIMULATOR_CAMERAS=30 python gpuapp.py
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from mjpeg_broadcaster import mjpeg_chunk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8090
+
+
+def simulator_cameras(count, host='127.0.0.1', port=DEFAULT_PORT, capacity=30):
+    """Camera registry entries (name, source, capacity) for a running simulator"""
+    return {f"b_{i + 1}": (f"Simulated camera {i + 1}", f"http://{host}:{port}/cam/{i}/video", capacity)
+            for i in range(count)}
+
+
+def load_clip(path, size=None, jpeg_quality=80, max_frames=600):
+    """Decode up to max_frames of a clip into encoded MJPEG chunks"""
+    cap = cv2.VideoCapture(path)
+    chunks = []
+    while len(chunks) < max_frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        if size is not None and (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        if success:
+            chunks.append(mjpeg_chunk(buffer))
+    cap.release()
+    if not chunks:
+        raise IOError(f"No frames could be read from {path}")
+    return chunks
+
+
+class SimulatedCamera:
+    """One looping camera with configurable pacing and failure behaviour.
+
+    Frames are sent every 1/fps seconds, each interval stretched or shrunk
+    by up to `jitter` (a fraction), and each frame is skipped with
+    probability `drop_rate`. With `disconnect_every` set, the camera goes
+    down for `disconnect_for` seconds at random intervals averaging that
+    many seconds: open streams are cut and new connections get a 503.
+    """
+
+    def __init__(self, chunks, fps=15.0, offset=0, jitter=0.0, drop_rate=0.0,
+                 disconnect_every=None, disconnect_for=5.0, seed=None):
+        self.chunks = chunks
+        self.fps = fps
+        self.offset = offset
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.disconnect_every = disconnect_every
+        self.disconnect_for = disconnect_for
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._down_until = 0.0
+        self._next_disconnect = self._schedule_disconnect(self._start)
+        self.clients = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.disconnects = 0
+
+    def _schedule_disconnect(self, now):
+        if not self.disconnect_every:
+            return float('inf')
+        return now + self.disconnect_every * self._random.uniform(0.5, 1.5)
+
+    def available(self):
+        """False while the camera is in a simulated outage"""
+        now = time.time()
+        with self._lock:
+            if now >= self._next_disconnect:
+                self._down_until = now + self.disconnect_for
+                self._next_disconnect = self._schedule_disconnect(self._down_until)
+                self.disconnects += 1
+            return now >= self._down_until
+
+    def frames(self):
+        """Paced MJPEG chunks for one client; ends when the camera drops out"""
+        with self._lock:
+            self.clients += 1
+        try:
+            interval = 1.0 / self.fps
+            next_frame = time.time()
+            while self.available():
+                next_frame += interval * (1 + self._random.uniform(-self.jitter, self.jitter))
+                delay = next_frame - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame = time.time()
+
+                if self._random.random() < self.drop_rate:
+                    with self._lock:
+                        self.frames_dropped += 1
+                    continue
+
+                index = (int((time.time() - self._start) * self.fps) + self.offset) % len(self.chunks)
+                with self._lock:
+                    self.frames_sent += 1
+                yield self.chunks[index]
+        finally:
+            with self._lock:
+                self.clients -= 1
+
+    def stats(self):
+        up = self.available()
+        with self._lock:
+            return {"clients": self.clients, "frames_sent": self.frames_sent,
+                    "frames_dropped": self.frames_dropped, "disconnects": self.disconnects, "up": up}
+
+
+class _CameraRequestHandler(BaseHTTPRequestHandler):
+    path_pattern = re.compile(r'^/cam/(\d+)/video$')
+
+    def do_GET(self):
+        if self.path == '/stats':
+            body = json.dumps({i: camera.stats() for i, camera in enumerate(self.server.cameras)}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        match = self.path_pattern.match(self.path)
+        if match is None or int(match.group(1)) >= len(self.server.cameras):
+            self.send_error(404)
+            return
+        camera = self.server.cameras[int(match.group(1))]
+        if not camera.available():
+            self.send_error(503, "Simulated outage")
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        try:
+            for chunk in camera.frames():
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class CameraSimulator:
+    """N simulated cameras behind one threaded HTTP server on loopback"""
+
+    def __init__(self, clips, count, host='127.0.0.1', port=DEFAULT_PORT, fps=15.0, size=None,
+                 jpeg_quality=80, max_frames=600, jitter=0.0, drop_rate=0.0,
+                 disconnect_every=None, disconnect_for=5.0, seed=None):
+        self.host = host
+        self.port = port
+        loaded = [load_clip(clip, size, jpeg_quality, max_frames) for clip in clips]
+        self.cameras = [SimulatedCamera(loaded[i % len(loaded)], fps=fps,
+                                        offset=(i // len(loaded)) * 37, jitter=jitter, drop_rate=drop_rate,
+                                        disconnect_every=disconnect_every, disconnect_for=disconnect_for,
+                                        seed=None if seed is None else seed + i)
+                        for i in range(count)]
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), _CameraRequestHandler)
+        self._server.daemon_threads = True
+        self._server.cameras = self.cameras
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Simulating {len(self.cameras)} cameras on http://{self.host}:{self.port}/cam/<n>/video")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def registry(self, capacity=30):
+        return simulator_cameras(len(self.cameras), self.host, self.port, capacity)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clips', nargs='+', help="video files to loop")
+    parser.add_argument('--cameras', type=int, default=30)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--fps', type=float, default=15.0)
+    parser.add_argument('--width', type=int, help="output resolution (default: the clip's own)")
+    parser.add_argument('--height', type=int)
+    parser.add_argument('--jpeg-quality', type=int, default=80)
+    parser.add_argument('--max-frames', type=int, default=600, help="frames of each clip to loop")
+    parser.add_argument('--jitter', type=float, default=0.0, help="frame interval jitter, fraction of 1/fps")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="probability of skipping a frame")
+    parser.add_argument('--disconnect-every', type=float, help="mean seconds between simulated outages")
+    parser.add_argument('--disconnect-for', type=float, default=5.0, help="outage length in seconds")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    if (args.width is None) != (args.height is None):
+        parser.error("--width and --height go together")
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = CameraSimulator(args.clips, args.cameras, host=args.host, port=args.port, fps=args.fps,
+                                size=(args.width, args.height) if args.width else None,
+                                jpeg_quality=args.jpeg_quality, max_frames=args.max_frames,
+                                jitter=args.jitter, drop_rate=args.drop_rate,
+                                disconnect_every=args.disconnect_every, disconnect_for=args.disconnect_for,
+                                seed=args.seed).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
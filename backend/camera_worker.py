@@ -0,0 +1,420 @@
+import threading
+import time
+import logging
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from connection_supervisor import default_supervisor
+from metrics import Histogram
+from mjpeg_broadcaster import DEFAULT_VARIANT, MJPEGBroadcaster
+
+logger = logging.getLogger(__name__)
+
+# Latest output of a worker: `final` marks a frame after which viewer streams end.
+FrameResult = namedtuple('FrameResult', ['seq', 'frame', 'count', 'final'])
+
+
+# 'latest' capture: a grab slower than this waited for the camera, i.e. the
+# buffer was empty; at most this many buffered frames are skipped per decode
+MIN_BLOCKING_GRAB = 0.005
+MAX_DRAIN = 30
+
+
+class StreamLag:
+    """Estimates how far behind the camera's own clock frames are being grabbed.
+
+    A frame cannot arrive before the camera stamped it, so the smallest
+    (arrival wall time - stream timestamp) seen since connecting is the
+    zero-lag offset; each frame's lag is its offset minus that minimum.
+
+    That only holds when the timestamps are a real clock. HTTP MJPEG
+    streams report frame index / an assumed fps instead, which drifts away
+    from wall time without bound, so the timestamps are only trusted once
+    they advanced at `min_rate`..`max_rate` times wall time over a
+    `window` of seconds. Untrusted or missing timestamps (CAP_PROP_POS_MSEC
+    stuck at 0) report None.
+    """
+
+    def __init__(self, window=5.0, min_rate=0.8, max_rate=1.25):
+        self.window = window
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.reset()
+
+    def reset(self):
+        self._base = None
+        self._last_pts = 0.0
+        self._window_start = None
+        self.trusted = False
+        self.lag = None
+
+    def _check_clock(self, arrival, pts):
+        if self._window_start is None:
+            self._window_start = (arrival, pts)
+            return
+        start_arrival, start_pts = self._window_start
+        if arrival - start_arrival >= self.window:
+            rate = (pts - start_pts) / (arrival - start_arrival)
+            self.trusted = self.min_rate <= rate <= self.max_rate
+            self._window_start = (arrival, pts)
+
+    def update(self, arrival, pts):
+        if pts <= 0 or pts == self._last_pts:
+            return self.lag if pts > 0 else None
+        self._last_pts = pts
+        self._check_clock(arrival, pts)
+        offset = arrival - pts
+        if self._base is None or offset < self._base:
+            self._base = offset
+        self.lag = offset - self._base if self.trusted else None
+        return self.lag
+
+
+def create_error_frame(building_id, error_message):
+    """Create an error frame when camera connection fails"""
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    cv2.putText(frame, f"Building: {building_id.upper()}",
+               (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    cv2.putText(frame, error_message,
+               (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    cv2.putText(frame, "Check camera connection",
+               (50, 250), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+
+    return frame
+
+
+class CameraWorker:
+    """Owns the single capture + inference loop of one camera.
+
+    Viewers subscribe to the worker instead of opening their own
+    `cv2.VideoCapture`, so a camera is decoded and run through the model once
+    however many browsers are watching it. The loop starts with the first
+    subscriber and stops `idle_timeout` seconds after the last one leaves,
+    unless the worker is pinned by the headless counting service.
+
+    `process_frame(building_id, frame, frame_index)` does the app specific work
+    (inference, overlays, updating crowd_data) and returns `(count, frame)`.
+    `on_status(building_id, status)` is called on 'online', 'error' and
+    'offline' transitions. Output frames are JPEG encoded once by the
+    worker's `broadcaster` and shared by every viewer.
+
+    Connections are opened by a ConnectionSupervisor (the process-wide one
+    unless `supervisor` is given): the loop only waits up to a second at a
+    time for a capture, publishing a "reconnecting" frame to viewers while
+    the supervisor retries the camera with backoff, and never gives up
+    while the worker is wanted.
+
+    `capture_mode='read'` decodes every frame with `cap.read()` and sleeps
+    `frame_interval` between them. `capture_mode='latest'` never sleeps:
+    it keeps the stream drained with `cap.grab()`, which skips the decode,
+    and only `retrieve()`s a frame once `frame_interval` has passed and the
+    frame is fresh - its estimated lag is within `target_lag`, or the grab
+    had to wait for the camera, so nothing newer was buffered. A due frame
+    is only decoded if it will be used: the worker has viewers, someone
+    called `request_frame()`, or the optional `wants_frame(building_id)`
+    returns True; otherwise it is grabbed and dropped undecoded.
+
+    Capture health (frames grabbed and read, read failures, reconnects, an
+    EWMA of the capture rate, stream lag, time spent in `process_frame`) is
+    kept in plain attributes written only by the loop thread and read by
+    /metrics.
+    """
+
+    def __init__(self, building_id, camera_source, process_frame, on_status=None, supervisor=None,
+                 max_failures=31, frame_interval=0.05, idle_timeout=5.0, jpeg_quality=None, queue_size=2,
+                 capture_mode='read', target_lag=0.2, frame_counter=None, wants_frame=None):
+        self.building_id = building_id
+        self.camera_source = camera_source
+        self.process_frame = process_frame
+        self.on_status = on_status
+        self.supervisor = supervisor or default_supervisor()
+        self.max_failures = max_failures
+        self.frame_interval = frame_interval
+        self.idle_timeout = idle_timeout
+        self.capture_mode = capture_mode
+        self.target_lag = target_lag
+        self.wants_frame = wants_frame
+
+        self.status = 'offline'
+        self.frame_count = 0
+        self.broadcaster = MJPEGBroadcaster(jpeg_quality=jpeg_quality, queue_size=queue_size,
+                                            frame_counter=frame_counter, building_id=building_id)
+
+        self.frames_grabbed = 0
+        self.frames_read = 0
+        self.read_failures = 0
+        self.connects = 0
+        self.capture_fps = 0.0
+        self.process_time = Histogram()
+        self.stream_lag = StreamLag()
+        self._last_frame_at = None
+        self._frame_period = 0.0
+
+        self._cond = threading.Condition()
+        self._latest = None
+        self._seq = 0
+        self._subscribers = 0
+        self._last_unsubscribe = 0.0
+        self._running = False
+        self._thread = None
+        self._pinned = False
+        self._frame_requested = False
+
+    def _ensure_running(self):
+        # Caller holds self._cond
+        if not self._running:
+            self._running = True
+            self._latest = None
+            self.broadcaster.reset()
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name=f"camera-{self.building_id}")
+            self._thread.start()
+
+    # --- Headless side ---
+    def pin(self):
+        """Keep the loop running without viewers (restarts it if it gave up)"""
+        with self._cond:
+            self._pinned = True
+            self._ensure_running()
+
+    def unpin(self):
+        with self._cond:
+            self._pinned = False
+            self._last_unsubscribe = time.time()
+
+    def keep_alive(self):
+        """Keep the loop running for another `idle_timeout` without counting as a viewer"""
+        with self._cond:
+            self._last_unsubscribe = max(self._last_unsubscribe, time.time())
+            self._ensure_running()
+
+    def request_frame(self):
+        """Have the loop decode its next due frame even if nothing else wants it"""
+        with self._cond:
+            self._frame_requested = True
+
+    @property
+    def pinned(self):
+        with self._cond:
+            return self._pinned
+
+    # --- Viewer side ---
+    def subscribe(self):
+        """Register a viewer, starting the capture loop if it is not running"""
+        with self._cond:
+            self._subscribers += 1
+            self._ensure_running()
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers = max(0, self._subscribers - 1)
+            self._last_unsubscribe = time.time()
+
+    @property
+    def subscribers(self):
+        with self._cond:
+            return self._subscribers
+
+    @property
+    def running(self):
+        with self._cond:
+            return self._running
+
+    def latest(self):
+        """Return the most recent FrameResult, or None before the first frame"""
+        with self._cond:
+            return self._latest
+
+    def wait_for_frame(self, last_seq, timeout=1.0):
+        """Block until a frame newer than `last_seq` is published"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._latest is not None and self._latest.seq > last_seq,
+                timeout=timeout)
+            if self._latest is not None and self._latest.seq > last_seq:
+                return self._latest
+            return None
+
+    # --- Capture loop ---
+    def _wanted(self):
+        """Keep running while someone watches; flips `_running` off atomically"""
+        with self._cond:
+            if self._pinned or self._subscribers > 0 or time.time() - self._last_unsubscribe < self.idle_timeout:
+                return True
+            self._running = False
+            return False
+
+    def _publish(self, frame, count, final=False):
+        with self._cond:
+            self._seq += 1
+            self._latest = FrameResult(self._seq, frame, count, final)
+            self._cond.notify_all()
+        self.broadcaster.publish(frame, final)
+
+    def _set_status(self, status):
+        if status == self.status:
+            return
+        self.status = status
+        if self.on_status is not None:
+            self.on_status(self.building_id, status)
+
+    def _count_capture(self):
+        # Smooth the interval, not the rate, so back-to-back drain grabs do not spike it
+        now = time.perf_counter()
+        if self._last_frame_at is not None:
+            self._frame_period += 0.1 * ((now - self._last_frame_at) - self._frame_period)
+            self.capture_fps = 1.0 / self._frame_period if self._frame_period > 0 else 0.0
+        self._last_frame_at = now
+
+    def _frame_wanted(self):
+        with self._cond:
+            if self._subscribers > 0 or self._frame_requested:
+                self._frame_requested = False
+                return True
+        return self.wants_frame is None or self.wants_frame(self.building_id)
+
+    def _read_latest(self, cap, next_due):
+        """Grab until a fresh frame is due, then decode only that one; (True, None)
+        when the due frame was grabbed but nothing wants it decoded"""
+        drained = 0
+        while True:
+            start = time.perf_counter()
+            if not cap.grab():
+                return False, None
+            waited = time.perf_counter() - start
+            self.frames_grabbed += 1
+            self._count_capture()
+            lag = self.stream_lag.update(time.time(), cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+
+            if time.perf_counter() < next_due:
+                continue
+            if drained == 0 and not self._frame_wanted():
+                return True, None
+            # A grab that blocked on the camera means nothing newer is queued;
+            # give up draining after ~a second of frames (e.g. local files)
+            if ((lag is not None and lag <= self.target_lag) or waited >= MIN_BLOCKING_GRAB
+                    or drained >= MAX_DRAIN):
+                return cap.retrieve()
+            drained += 1
+
+    def _run(self):
+        last_error_frame = 0.0
+        try:
+            while self._wanted():
+                cap = self.supervisor.acquire(self.building_id, self.camera_source, timeout=1.0)
+                if cap is None:
+                    # Still connecting or backing off: tell viewers, at most once a second
+                    state = self.supervisor.state(self.building_id)
+                    if state in ('backoff', 'offline'):
+                        self._set_status('error' if state == 'backoff' else 'offline')
+                    if time.time() - last_error_frame >= 1.0:
+                        retry_in = self.supervisor.retry_in(self.building_id)
+                        message = f"Reconnecting in {retry_in:.0f}s" if retry_in else "Connecting..."
+                        self._publish(create_error_frame(self.building_id, message), 0)
+                        last_error_frame = time.time()
+                    continue
+
+                error = "stream lost"
+                try:
+                    logger.info(f"Streaming {self.building_id}: {self.camera_source}")
+                    self._set_status('online')
+                    self.connects += 1
+                    self._last_frame_at = None
+                    self._frame_period = 0.0
+                    self.stream_lag.reset()
+                    consecutive_failures = 0
+                    next_due = 0.0
+
+                    while self._wanted():
+                        if self.capture_mode == 'latest':
+                            success, frame = self._read_latest(cap, next_due)
+                        else:
+                            success, frame = cap.read()
+
+                        if not success:
+                            consecutive_failures += 1
+                            self.read_failures += 1
+                            logger.warning(f"Frame read failed for {self.building_id}, count: {consecutive_failures}")
+                            if consecutive_failures >= self.max_failures:
+                                logger.error(f"Too many failures for {self.building_id}, reconnecting...")
+                                error = f"{consecutive_failures} failed reads"
+                                break
+                            time.sleep(0.1)
+                            continue
+
+                        consecutive_failures = 0
+                        if frame is None:
+                            # Not decoded: nothing wanted it, ask again after frame_interval
+                            next_due = time.perf_counter() + self.frame_interval
+                            continue
+
+                        self.frame_count += 1
+                        self.frames_read += 1
+                        now = time.perf_counter()
+                        if self.capture_mode != 'latest':
+                            self._count_capture()
+
+                        count, frame = self.process_frame(self.building_id, frame, self.frame_count)
+                        self.process_time.observe(time.perf_counter() - now)
+                        self._publish(frame, count)
+
+                        if self.capture_mode == 'latest':
+                            next_due = now + self.frame_interval
+                        elif self.frame_interval:
+                            time.sleep(self.frame_interval)
+                    else:
+                        return
+
+                except Exception as e:
+                    logger.error(f"Exception in {self.building_id} stream: {str(e)}")
+                    error = str(e)
+                finally:
+                    cap.release()
+
+                self.capture_fps = 0.0
+                self._set_status('error')
+                self.supervisor.report_lost(self.building_id, error)
+        finally:
+            self.supervisor.release(self.building_id)
+            # A newer loop may already have been started by a late subscriber
+            with self._cond:
+                if self._thread is threading.current_thread():
+                    self._running = False
+
+
+class CameraWorkerPool:
+    """Lazily creates one CameraWorker per building and shares it between viewers"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def get(self, building_id):
+        with self._lock:
+            worker = self._workers.get(building_id)
+            if worker is None:
+                worker = self._factory(building_id)
+                self._workers[building_id] = worker
+            return worker
+
+    def workers(self):
+        with self._lock:
+            return dict(self._workers)
+
+    def active_count(self):
+        return sum(1 for worker in self.workers().values() if worker.running)
+
+
+def mjpeg_stream(worker, variant=DEFAULT_VARIANT):
+    """Yield multipart JPEG chunks of a StreamVariant for one viewer of a shared CameraWorker"""
+    worker.subscribe()
+    subscriber = worker.broadcaster.subscribe(variant)
+    try:
+        yield from worker.broadcaster.stream(subscriber)
+    finally:
+        worker.broadcaster.unsubscribe(subscriber)
+        worker.unsubscribe()
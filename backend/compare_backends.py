@@ -0,0 +1,107 @@
+"""Compare inference backends against the eager torch path on recorded clips.
+
+Example:
+    python compare_backends.py clips/canteen.mp4 clips/theatre.mp4 \
+        --backend torch=models/yolov5s.pt --backend onnx=models/yolov5s.onnx \
+        --backend onnx-int8=models/yolov5s.onnx --every 5
+
+The first --backend is the reference; every other backend is scored on
+frames per second and on how often its count agrees with the reference.
+ONNX graphs come from the vendored YOLOv5 code:
+    python models/yolov5/export.py --weights models/yolov5s.pt --include onnx
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from crowd_counter import CrowdCounter
+
+
+def load_frames(clips, every, max_frames, width):
+    """Decode every Nth frame of the clips once, so all backends see the same input"""
+    frames = []
+    for clip in clips:
+        cap = cv2.VideoCapture(clip)
+        index = 0
+        while len(frames) < max_frames:
+            success, frame = cap.read()
+            if not success:
+                break
+            index += 1
+            if index % every:
+                continue
+            if width and frame.shape[1] > width:
+                scale = width / frame.shape[1]
+                frame = cv2.resize(frame, (width, int(frame.shape[0] * scale)))
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+def run_backend(name, model_path, frames, batch_size):
+    counter = CrowdCounter(model_path=model_path, backend=name, warmup_size=frames[0].shape[:2],
+                           warmup_batch=batch_size)
+    counts = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        counts.extend(count for count, _ in counter.count_batch(frames[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+    return {
+        "backend": name,
+        "model": model_path,
+        "startup_s": counter.startup_report['total_s'],
+        "fps": round(len(frames) / elapsed, 2) if elapsed > 0 else 0,
+        "counts": counts
+    }
+
+
+def agreement(reference, counts):
+    reference, counts = np.asarray(reference), np.asarray(counts)
+    diff = np.abs(reference - counts)
+    return {
+        "exact_match": round(float((diff == 0).mean()), 3),
+        "within_one": round(float((diff <= 1).mean()), 3),
+        "mean_abs_diff": round(float(diff.mean()), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clips', nargs='+', help="recorded video files")
+    parser.add_argument('--backend', action='append', required=True, metavar='NAME=MODEL',
+                        help="backend and model path, e.g. onnx=models/yolov5s.onnx (first is the reference)")
+    parser.add_argument('--every', type=int, default=5, help="use every Nth frame of each clip")
+    parser.add_argument('--max-frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=640, help="downscale frames wider than this")
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    frames = load_frames(args.clips, args.every, args.max_frames, args.width)
+    if not frames:
+        parser.error("no frames could be read from the clips")
+    print(f"Loaded {len(frames)} frames from {len(args.clips)} clip(s)")
+
+    results = []
+    for spec in args.backend:
+        name, _, model_path = spec.partition('=')
+        results.append(run_backend(name, model_path, frames, args.batch_size))
+
+    reference = results[0]
+    print(f"\n{'backend':<12}{'fps':>8}{'speedup':>9}{'exact':>8}{'+-1':>8}{'MAE':>8}")
+    for result in results:
+        result.update(agreement(reference['counts'], result['counts']))
+        speedup = result['fps'] / reference['fps'] if reference['fps'] else 0
+        print(f"{result['backend']:<12}{result['fps']:>8.1f}{speedup:>8.2f}x"
+              f"{result['exact_match']:>8.1%}{result['within_one']:>8.1%}{result['mean_abs_diff']:>8.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"frames": len(frames), "clips": args.clips, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
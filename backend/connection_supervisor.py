@@ -0,0 +1,234 @@
+import heapq
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# unknown -> connecting -> online, or -> backoff -> ... -> offline after `offline_after` failures in a row
+HEALTH_STATES = ('unknown', 'connecting', 'online', 'backoff', 'offline')
+
+
+def configure_capture(cap, camera_source):
+    """Apply the per-protocol capture settings used by the streaming apps"""
+    if isinstance(camera_source, str) and camera_source.startswith('rtsp://'):
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        cap.set(cv2.CAP_PROP_FPS, 15)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    elif isinstance(camera_source, str) and camera_source.startswith('http://'):
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 2)
+        cap.set(cv2.CAP_PROP_FPS, 20)
+
+
+def open_capture(camera_source, timeout_ms=5000):
+    """Open a camera with open/read timeouts applied while connecting, not after"""
+    if isinstance(camera_source, str):
+        cap = cv2.VideoCapture(camera_source, cv2.CAP_FFMPEG,
+                               [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                                cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms])
+    else:
+        cap = cv2.VideoCapture(camera_source)
+    configure_capture(cap, camera_source)
+    return cap
+
+
+class ConnectionSupervisor:
+    """Opens camera connections on a small thread pool, never on a worker or request thread.
+
+    Camera workers call `acquire()`, which returns an opened capture or
+    None after `timeout` seconds, so a dead device never holds up a
+    capture loop for longer than that. Opens run concurrently (up to
+    `max_concurrent` at once), so probing 30 cameras costs one open
+    timeout rather than thirty. A failed open or a lost connection is
+    retried after an exponential backoff of base_delay * 2^(failures - 1),
+    capped at `max_delay` and shortened by up to `jitter` so cameras that
+    dropped together do not retry in lockstep. Retries continue for as
+    long as a worker wants the camera; `health()` reports each camera's
+    state.
+    """
+
+    def __init__(self, max_concurrent=16, open_timeout=5.0, base_delay=1.0, max_delay=60.0, jitter=0.5,
+                 offline_after=3, idle_release=10.0):
+        self.open_timeout = open_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.offline_after = offline_after
+        self.idle_release = idle_release
+
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="camera-open")
+        self._cond = threading.Condition()
+        self._cameras = {}
+        self._schedule = []
+        self._thread = threading.Thread(target=self._run_schedule, daemon=True, name="camera-supervisor")
+        self._thread.start()
+
+    def _camera(self, building_id, camera_source):
+        # Caller holds self._cond
+        camera = self._cameras.get(building_id)
+        if camera is None:
+            camera = {'source': camera_source, 'state': 'unknown', 'wanted': False, 'opening': False,
+                      'capture': None, 'opened_at': 0.0, 'next_attempt': None, 'failures': 0,
+                      'attempts': 0, 'total_failures': 0, 'last_error': None, 'last_online': None,
+                      'open_s': None}
+            self._cameras[building_id] = camera
+        return camera
+
+    def _start_open(self, building_id, camera):
+        # Caller holds self._cond
+        if camera['opening'] or camera['capture'] is not None:
+            return
+        camera['opening'] = True
+        camera['next_attempt'] = None
+        if camera['state'] in ('unknown', 'online'):
+            camera['state'] = 'connecting'
+        self._pool.submit(self._open, building_id, camera['source'])
+
+    def _open(self, building_id, camera_source):
+        start = time.perf_counter()
+        error = None
+        cap = None
+        try:
+            cap = open_capture(camera_source, int(self.open_timeout * 1000))
+            if not cap.isOpened():
+                error = "could not open stream"
+        except Exception as e:
+            error = str(e)
+        elapsed = time.perf_counter() - start
+
+        with self._cond:
+            camera = self._cameras[building_id]
+            camera['opening'] = False
+            camera['attempts'] += 1
+            camera['open_s'] = round(elapsed, 3)
+            if error is None:
+                logger.info(f"Connected to {building_id} in {elapsed:.1f}s")
+                camera.update(state='online', capture=cap, opened_at=time.time(), failures=0,
+                              last_error=None, last_online=time.time())
+                self._cond.notify_all()
+                return
+            camera['last_error'] = error
+            self._failed(building_id, camera)
+            self._cond.notify_all()
+        if cap is not None:
+            cap.release()
+
+    def _failed(self, building_id, camera):
+        # Caller holds self._cond
+        camera['failures'] += 1
+        camera['total_failures'] += 1
+        camera['state'] = 'offline' if camera['failures'] >= self.offline_after else 'backoff'
+        delay = min(self.max_delay, self.base_delay * 2 ** (camera['failures'] - 1))
+        delay *= 1 - self.jitter * random.random()
+        camera['next_attempt'] = time.time() + delay
+        heapq.heappush(self._schedule, (camera['next_attempt'], building_id))
+        logger.warning(f"{building_id} unavailable ({camera['last_error']}), "
+                       f"retry {camera['failures']} in {delay:.1f}s")
+
+    def _run_schedule(self):
+        """Start due retries and close probed captures nobody claimed"""
+        while True:
+            with self._cond:
+                now = time.time()
+                while self._schedule and self._schedule[0][0] <= now:
+                    due, building_id = heapq.heappop(self._schedule)
+                    camera = self._cameras[building_id]
+                    if camera['next_attempt'] != due:
+                        continue
+                    if camera['wanted']:
+                        self._start_open(building_id, camera)
+                    else:
+                        # Nobody wants it now; the next acquire() opens it straight away
+                        camera['next_attempt'] = None
+
+                idle = []
+                for camera in self._cameras.values():
+                    if (camera['capture'] is not None and not camera['wanted']
+                            and now - camera['opened_at'] > self.idle_release):
+                        idle.append(camera['capture'])
+                        camera['capture'] = None
+
+                timeout = self._schedule[0][0] - now if self._schedule else 1.0
+                self._cond.wait(timeout=min(max(timeout, 0.05), 1.0))
+            for cap in idle:
+                cap.release()
+
+    def probe_all(self, sources):
+        """Open every camera concurrently; unclaimed connections are closed after `idle_release`"""
+        with self._cond:
+            for building_id, camera_source in sources.items():
+                self._start_open(building_id, self._camera(building_id, camera_source))
+
+    def acquire(self, building_id, camera_source, timeout=1.0):
+        """Take an opened capture for a worker, or None if none is ready within `timeout`"""
+        with self._cond:
+            camera = self._camera(building_id, camera_source)
+            camera['wanted'] = True
+            if camera['capture'] is None and (camera['next_attempt'] is None
+                                              or camera['next_attempt'] <= time.time()):
+                self._start_open(building_id, camera)
+            self._cond.wait_for(lambda: camera['capture'] is not None, timeout=timeout)
+            cap, camera['capture'] = camera['capture'], None
+            return cap
+
+    def report_lost(self, building_id, error="stream lost"):
+        """A worker's connection died; reconnect after a backoff"""
+        with self._cond:
+            camera = self._cameras[building_id]
+            camera['last_error'] = error
+            self._failed(building_id, camera)
+            self._cond.notify_all()
+
+    def release(self, building_id):
+        """The camera's worker stopped; stop retrying it"""
+        with self._cond:
+            camera = self._cameras.get(building_id)
+            if camera is not None:
+                camera['wanted'] = False
+                camera['next_attempt'] = None
+
+    def state(self, building_id):
+        with self._cond:
+            camera = self._cameras.get(building_id)
+            return camera['state'] if camera is not None else 'unknown'
+
+    def retry_in(self, building_id):
+        """Seconds until the next reconnect attempt, or None"""
+        with self._cond:
+            camera = self._cameras.get(building_id)
+            if camera is None or camera['next_attempt'] is None:
+                return None
+            return max(0.0, camera['next_attempt'] - time.time())
+
+    def health(self):
+        """Per-camera connection state, failure counters and next retry"""
+        now = time.time()
+        with self._cond:
+            return {building_id: {
+                "state": camera['state'],
+                "consecutive_failures": camera['failures'],
+                "attempts": camera['attempts'],
+                "total_failures": camera['total_failures'],
+                "retry_in_s": round(camera['next_attempt'] - now, 1) if camera['next_attempt'] else None,
+                "last_open_s": camera['open_s'],
+                "last_online": camera['last_online'],
+                "last_error": camera['last_error']
+            } for building_id, camera in self._cameras.items()}
+
+
+_default_supervisor = None
+_default_lock = threading.Lock()
+
+
+def default_supervisor():
+    """Process-wide supervisor for workers that were not given one"""
+    global _default_supervisor
+    with _default_lock:
+        if _default_supervisor is None:
+            _default_supervisor = ConnectionSupervisor()
+        return _default_supervisor
@@ -0,0 +1,65 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CountingService:
+    """Runs the counting loop of every configured camera from boot.
+
+    Counts no longer depend on someone having a stream open: each camera's
+    worker is pinned so it keeps capturing and counting with no HTTP
+    client, and the MJPEG routes simply tap into the running workers.
+    Reconnects are the connection supervisor's job; a worker whose loop
+    has died anyway is restarted after `restart_delay` seconds.
+    """
+
+    def __init__(self, worker_pool, building_ids, restart_delay=30, check_interval=5):
+        self.worker_pool = worker_pool
+        self.building_ids = list(building_ids)
+        self.restart_delay = restart_delay
+        self.check_interval = check_interval
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._stopped_since = {}
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        logger.info(f"Starting headless counting for {len(self.building_ids)} cameras")
+        for building_id in self.building_ids:
+            self.worker_pool.get(building_id).pin()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._monitor, daemon=True, name="counting-service")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.check_interval + 1)
+            self._thread = None
+        for building_id in self.building_ids:
+            self.worker_pool.get(building_id).unpin()
+
+    def _monitor(self):
+        while not self._stop.wait(self.check_interval):
+            now = time.time()
+            for building_id in self.building_ids:
+                worker = self.worker_pool.get(building_id)
+                if worker.running:
+                    self._stopped_since.pop(building_id, None)
+                    continue
+
+                stopped_since = self._stopped_since.setdefault(building_id, now)
+                if now - stopped_since >= self.restart_delay:
+                    logger.info(f"Restarting counting loop for {building_id}")
+                    self._stopped_since.pop(building_id, None)
+                    worker.pin()
+
+    def running_count(self):
+        return sum(1 for building_id in self.building_ids
+                   if self.worker_pool.get(building_id).running)
@@ -1,23 +1,225 @@
+import os
+import time
+import logging
+
 import torch
 import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PERSON_CLASS = 0  # class 0 corresponds to person in COCO dataset
+
+
+def to_rgb(frame):
+    """cv2 frames are BGR; both backends feed the model RGB"""
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+# Vendored copy of the ultralytics/yolov5 hub code (hubconf.py, models/, utils/)
+DEFAULT_REPO_DIR = 'models/yolov5'
+
+BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+
+def find_local_repo(repo_dir):
+    """Locate YOLOv5 hub code on disk: the vendored copy first, then the torch.hub cache"""
+    candidates = [repo_dir, os.path.join(torch.hub.get_dir(), 'ultralytics_yolov5_master')]
+    for candidate in candidates:
+        if candidate and os.path.isfile(os.path.join(candidate, 'hubconf.py')):
+            return candidate
+    return None
+
+
+def quantize_onnx(onnx_path, int8_path):
+    """Write a dynamically INT8-quantized copy of an exported ONNX graph"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+class TorchBackend:
+    """Eager PyTorch YOLOv5 loaded through torch.hub"""
+
+    def __init__(self, model_path, conf, iou, repo_dir=DEFAULT_REPO_DIR, offline=True, input_size=640):
+        # Load from disk only; never reach GitHub or pip on the edge boxes
+        local_repo = find_local_repo(repo_dir)
+        if local_repo is not None:
+            os.environ.setdefault('YOLOv5_AUTOINSTALL', 'False')
+            self.model = torch.hub.load(local_repo, 'custom', path=model_path, source='local', _verbose=False)
+            self.source = local_repo
+        elif offline:
+            raise FileNotFoundError(f"YOLOv5 code not found in '{repo_dir}' or the torch.hub cache; "
+                                    f"vendor ultralytics/yolov5 there or pass offline=False")
+        else:
+            self.model = torch.hub.load('ultralytics/yolov5', 'custom', path=model_path)
+            self.source = 'github'
+
+        self.model.conf = conf  # confidence threshold
+        self.model.iou = iou
+        self.model.classes = [PERSON_CLASS]  # NMS only ever sees person boxes
+        self.input_size = input_size
+
+    def detect(self, frames):
+        """Return an (N, 4) int32 array of person boxes per frame"""
+        # Never upscale: small (e.g. ROI-cropped) frames run at their own size, rounded to the stride
+        longest = max(max(frame.shape[:2]) for frame in frames)
+        size = int(np.ceil(min(longest, self.input_size) / 32) * 32)
+        results = self.model([to_rgb(frame) for frame in frames], size=size)
+        boxes = []
+
+        for detections in results.xyxy:  # one (N, 6) tensor per frame
+            people = detections[detections[:, 5] == PERSON_CLASS]
+            boxes.append(people[:, :4].int().cpu().numpy().astype(np.int32, copy=False))
+
+        return boxes
+
+
+class OnnxBackend:
+    """YOLOv5 exported to ONNX (`export.py --include onnx`) and run with ONNX Runtime.
+
+    Pre- and post-processing (letterbox, person score filter, NMS, rescale)
+    are done in NumPy/OpenCV so the backend needs neither torch nor the
+    YOLOv5 code at runtime.
+    """
+
+    def __init__(self, onnx_path, conf, iou, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.source = onnx_path
+        self.conf = conf
+        self.iou = iou
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_size = model_input.shape[2] if isinstance(model_input.shape[2], int) else 640
+        # Graphs exported without --dynamic only take one image at a time
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+    def _letterbox(self, frame):
+        height, width = frame.shape[:2]
+        ratio = min(self.input_size / height, self.input_size / width)
+        new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+        pad_x, pad_y = (self.input_size - new_width) // 2, (self.input_size - new_height) // 2
+
+        canvas = np.full((self.input_size, self.input_size, 3), 114, dtype=np.uint8)
+        canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(frame, (new_width, new_height))
+        return canvas, ratio, pad_x, pad_y
+
+    def _postprocess(self, prediction, frame_shape, ratio, pad_x, pad_y):
+        # prediction: (num_anchors, 5 + num_classes) as cx, cy, w, h, objectness, class scores
+        class_scores = prediction[:, 5:]
+        scores = prediction[:, 4] * class_scores[:, PERSON_CLASS]
+        keep = (scores > self.conf) & (class_scores.argmax(axis=1) == PERSON_CLASS)
+        if not keep.any():
+            return np.empty((0, 4), dtype=np.int32)
+
+        prediction, scores = prediction[keep], scores[keep]
+        xywh = prediction[:, :4].copy()
+        xywh[:, :2] -= xywh[:, 2:] / 2  # centre to top-left
+        indices = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), self.conf, self.iou)
+        xywh = xywh[np.asarray(indices, dtype=np.int64).reshape(-1)]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2]
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:]
+        boxes -= (pad_x, pad_y, pad_x, pad_y)
+        boxes /= ratio
+
+        height, width = frame_shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+        return boxes.astype(np.int32)
+
+    def detect(self, frames):
+        """Return an (N, 4) int32 array of person boxes per frame"""
+        letterboxed = [self._letterbox(frame) for frame in frames]
+        blob = np.stack([to_rgb(canvas) for canvas, _, _, _ in letterboxed])
+        blob = np.ascontiguousarray(blob.transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+        if self.fixed_batch == 1:
+            predictions = [self.session.run(None, {self.input_name: blob[i:i + 1]})[0][0]
+                           for i in range(len(frames))]
+        else:
+            predictions = self.session.run(None, {self.input_name: blob})[0]
+
+        return [self._postprocess(prediction, frame.shape, ratio, pad_x, pad_y)
+                for prediction, frame, (_, ratio, pad_x, pad_y) in zip(predictions, frames, letterboxed)]
+
+
+def create_backend(backend, model_path, conf=0.3, iou=0.45, repo_dir=DEFAULT_REPO_DIR, offline=True):
+    """Build the inference backend named in the configuration"""
+    if backend == 'torch':
+        return TorchBackend(model_path, conf, iou, repo_dir=repo_dir, offline=offline)
+    if backend == 'onnx':
+        return OnnxBackend(model_path, conf, iou)
+    if backend == 'onnx-int8':
+        int8_path = model_path if model_path.endswith('.int8.onnx') else model_path.replace('.onnx', '.int8.onnx')
+        if not os.path.isfile(int8_path):
+            logger.info(f"Quantizing {model_path} to INT8 at {int8_path}")
+            quantize_onnx(model_path, int8_path)
+        return OnnxBackend(int8_path, conf, iou)
+    raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+
 
 class CrowdCounter:
-    def __init__(self, model_path='models/yolov5s.pt'):
-        self.model = torch.hub.load('ultralytics/yolov5', 'custom', path=model_path)
-        self.model.conf = 0.3  # confidence threshold
+    def __init__(self, model_path='models/yolov5s.pt', backend='torch', repo_dir=DEFAULT_REPO_DIR,
+                 offline=True, conf=0.3, iou=0.45, warmup_size=(480, 640), warmup_batch=1):
+        start = time.perf_counter()
+        self.startup_report = {'backend': backend}
+
+        self.backend = create_backend(backend, model_path, conf=conf, iou=iou,
+                                      repo_dir=repo_dir, offline=offline)
+        self.startup_report['source'] = self.backend.source
+        self.startup_report['load_s'] = round(time.perf_counter() - start, 3)
+
+        self.warmup(warmup_size, warmup_batch)
+        self.startup_report['total_s'] = round(time.perf_counter() - start, 3)
+        logger.info(f"CrowdCounter ready: {self.startup_report}")
+
+    def warmup(self, size=(480, 640), batch=1):
+        """Run dummy frames through the model so the first real frame is not the slow one"""
+        height, width = size
+        dummy = np.zeros((height, width, 3), dtype=np.uint8)
+
+        start = time.perf_counter()
+        self.backend.detect([dummy])
+        self.startup_report['first_inference_s'] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        self.backend.detect([dummy] * max(1, batch))
+        self.startup_report[f'warm_batch_{max(1, batch)}_s'] = round(time.perf_counter() - start, 3)
 
     def count_people(self, frame):
-        results = self.model(frame)
-        detections = results.xyxy[0]  # bounding boxes
-        count = 0
-
-        for *box, conf, cls in detections:
-            if int(cls) == 0:  # class 0 corresponds to person in COCO dataset
-                count += 1
-                # Draw rectangle on frame
-                frame = cv2.rectangle(frame, (int(box[0]), int(box[1])), (int(box[2]), int(box[3])), (0, 255, 0), 2)
-        
+        """Count people and draw them onto the frame (kept for the simple apps)"""
+        count, boxes = self.count(frame)
+        frame = self.annotate(frame, boxes, count)
+        return count, frame
+
+    def count(self, frame):
+        """Return (count, boxes) for one frame without touching the image"""
+        return self.count_batch([frame])[0]
+
+    def count_batch(self, frames):
+        """Run one forward pass over several frames and return (count, boxes) per frame.
+
+        `boxes` is an (N, 4) int32 array of x1, y1, x2, y2 person boxes.
+        """
+        return [(len(boxes), boxes) for boxes in self.backend.detect(frames)]
+
+    @staticmethod
+    def annotate(frame, boxes, count):
+        """Draw person boxes and the people count onto a frame"""
+        for x1, y1, x2, y2 in np.asarray(boxes).tolist():
+            frame = cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
         # Put count text
         cv2.putText(frame, f'People Count: {count}', (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
-        
-        return count, frame
+
+        return frame
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import numpy as np
+
+STATUSES = ('offline', 'online', 'error')
+
+STATE_DTYPE = np.dtype([
+    ('current_count', np.int32),
+    ('max_capacity', np.int32),
+    ('occupancy_rate', np.float32),
+    ('last_updated', np.float64),
+    ('last_changed', np.float64),
+    ('status', np.uint8),
+])
+
+
+class CrowdStateStore:
+    """Live per-camera state in a NumPy structured array, one fixed-width row per camera.
+
+    Writers update their row in place, bracketed by a seqlock: the sequence
+    number is odd while a write is in progress. Readers never lock - they
+    copy the array and retry if the sequence moved underneath them, so a
+    snapshot is always consistent.
+
+    The published version only moves when a count or status changes, not
+    on the periodic refreshes that just restamp `last_updated`, so
+    `current()` keeps handing out the same (version, array) copy - and
+    SerializedCache the same body and ETag - while nothing visible changed.
+    `last_changed` records when a row's count or status last changed; a
+    snapshot's `last_updated` may be behind the live row's, so bodies built
+    from snapshots should report `last_changed` instead. Fleet aggregates
+    are single vectorized operations over the snapshot.
+    """
+
+    def __init__(self, capacities):
+        self.building_ids = list(capacities)
+        self.index = {building_id: i for i, building_id in enumerate(self.building_ids)}
+
+        self._rows = np.zeros(len(self.building_ids), dtype=STATE_DTYPE)
+        self._rows['max_capacity'] = [capacities[building_id] for building_id in self.building_ids]
+        self._write_lock = threading.Lock()
+        self._seq = 0
+        self._version = 0
+        self._snapshot = (0, self._rows.copy())
+
+    def update(self, building_id, count=None, status=None, timestamp=None):
+        """Write one camera's row; occupancy follows the count"""
+        i = self.index[building_id]
+        with self._write_lock:
+            self._seq += 1
+            try:
+                row = self._rows[i]
+                changed = False
+                if count is not None and count != row['current_count']:
+                    capacity = row['max_capacity']
+                    row['current_count'] = count
+                    row['occupancy_rate'] = count / capacity * 100 if capacity > 0 else 0.0
+                    changed = True
+                if status is not None and STATUSES.index(status) != row['status']:
+                    row['status'] = STATUSES.index(status)
+                    changed = True
+                if changed:
+                    self._version += 1
+                    row['last_changed'] = timestamp if timestamp is not None else time.time()
+                if timestamp is not None:
+                    row['last_updated'] = timestamp
+            finally:
+                self._seq += 1
+
+    @property
+    def version(self):
+        return self._version
+
+    def _read(self, rows):
+        """Consistent (version, copy) of `rows`, a view of self._rows, retried around writes"""
+        while True:
+            seq = self._seq
+            if seq % 2:
+                time.sleep(0)
+                continue
+            version = self._version
+            copy = rows.copy()
+            if self._seq == seq:
+                return version, copy
+
+    def current(self):
+        """(version, read-only structured array) consistent snapshot, copied once per version"""
+        version, rows = self._snapshot
+        if self._version == version:
+            return self._snapshot
+        version, rows = self._read(self._rows)
+        rows.flags.writeable = False
+        self._snapshot = (version, rows)
+        return self._snapshot
+
+    def get(self, building_id, snapshot=None):
+        """One camera's row as a plain dict (current_count, max_capacity, occupancy_rate, ...);
+        the live row unless a snapshot is given"""
+        i = self.index[building_id]
+        if snapshot is None:
+            _, row = self._read(self._rows[i:i + 1])
+            row = row[0]
+        else:
+            row = snapshot[i]
+        return {
+            'current_count': int(row['current_count']),
+            'max_capacity': int(row['max_capacity']),
+            'occupancy_rate': float(row['occupancy_rate']),
+            'last_updated': float(row['last_updated']),
+            'last_changed': float(row['last_changed']),
+            'status': STATUSES[row['status']]
+        }
+
+    def aggregates(self, snapshot=None, high_occupancy=75.0):
+        """Fleet-wide totals over a snapshot"""
+        if snapshot is None:
+            _, snapshot = self.current()
+        total_people = int(snapshot['current_count'].sum())
+        total_capacity = int(snapshot['max_capacity'].sum())
+        return {
+            'total_people': total_people,
+            'total_capacity': total_capacity,
+            'avg_occupancy': total_people / total_capacity * 100 if total_capacity > 0 else 0.0,
+            'online': int(np.count_nonzero(snapshot['status'] == STATUSES.index('online'))),
+            'high_occupancy': int(np.count_nonzero(snapshot['occupancy_rate'] > high_occupancy))
+        }
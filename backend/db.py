@@ -1,7 +1,15 @@
 import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
 from datetime import datetime
 
-conn = sqlite3.connect('building_counts.db', check_same_thread=False)
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'building_counts.db'
+
+conn = sqlite3.connect(DB_PATH, check_same_thread=False)
 cursor = conn.cursor()
 
 cursor.execute('''
@@ -58,3 +66,281 @@ conn.commit()
 def get_all_counts():
     cursor.execute('SELECT building_id, building_name, current_count FROM building_count')
     return cursor.fetchall()
+
+
+# --- Live count history ---
+# One row per building per second. WITHOUT ROWID keeps the rows inside the
+# (building_id, ts) primary key b-tree, so there is no separate index to
+# store: 30 cameras at 1 Hz is ~2.6M rows and a few tens of MB per day.
+def init_history(db_conn):
+    db_conn.execute('PRAGMA journal_mode=WAL')
+    db_conn.execute('PRAGMA synchronous=NORMAL')
+    db_conn.execute('''
+    CREATE TABLE IF NOT EXISTS crowd_history (
+        building_id TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (building_id, ts)
+    ) WITHOUT ROWID
+    ''')
+    db_conn.execute('''
+    CREATE TABLE IF NOT EXISTS crowd_rollup (
+        resolution INTEGER NOT NULL,
+        building_id TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        min_count INTEGER NOT NULL,
+        max_count INTEGER NOT NULL,
+        PRIMARY KEY (resolution, building_id, bucket)
+    ) WITHOUT ROWID
+    ''')
+    db_conn.commit()
+
+
+# --- Rollups ---
+# Pre-aggregated min/max/avg per bucket, updated in the same transaction as
+# the raw rows so range queries never have to scan crowd_history.
+RESOLUTIONS = {
+    'raw': None,
+    '1min': 60,
+    '15min': 15 * 60,
+    'hourly': 60 * 60,
+    'daily': 24 * 60 * 60,
+}
+
+# How long each resolution is kept, in seconds (None = forever)
+RETENTION = {
+    'raw': 7 * 24 * 3600,
+    '1min': 30 * 24 * 3600,
+    '15min': 180 * 24 * 3600,
+    'hourly': 2 * 365 * 24 * 3600,
+    'daily': None,
+}
+
+# Buckets follow local wall-clock time, so 'daily' means midnight to midnight on site
+UTC_OFFSET = time.localtime().tm_gmtoff
+
+
+def bucket_start(ts, resolution):
+    return (ts + UTC_OFFSET) // resolution * resolution - UTC_OFFSET
+
+
+def update_rollups(db_conn, rows):
+    """Fold (building_id, ts, count) rows into every rollup resolution"""
+    for name, resolution in RESOLUTIONS.items():
+        if resolution is None:
+            continue
+        buckets = {}
+        for building_id, ts, count in rows:
+            key = (building_id, bucket_start(ts, resolution))
+            entry = buckets.get(key)
+            if entry is None:
+                buckets[key] = [1, count, count, count]
+            else:
+                entry[0] += 1
+                entry[1] += count
+                entry[2] = min(entry[2], count)
+                entry[3] = max(entry[3], count)
+
+        db_conn.executemany('''
+            INSERT INTO crowd_rollup (resolution, building_id, bucket, samples, total, min_count, max_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (resolution, building_id, bucket) DO UPDATE SET
+                samples = samples + excluded.samples,
+                total = total + excluded.total,
+                min_count = MIN(min_count, excluded.min_count),
+                max_count = MAX(max_count, excluded.max_count)
+        ''', [(resolution, building_id, bucket, samples, total, low, high)
+              for (building_id, bucket), (samples, total, low, high) in buckets.items()])
+
+
+def apply_retention(db_conn, now=None):
+    """Delete raw rows and rollup buckets older than their RETENTION window"""
+    now = int(now if now is not None else time.time())
+    deleted = 0
+    with db_conn:
+        building_ids = [row[0] for row in db_conn.execute(
+            'SELECT DISTINCT building_id FROM crowd_rollup WHERE resolution = ?', (RESOLUTIONS['daily'],))]
+        for name, keep in RETENTION.items():
+            if keep is None:
+                continue
+            cutoff = now - keep
+            for building_id in building_ids:
+                # Per-building deletes walk the primary key instead of scanning the table
+                if name == 'raw':
+                    result = db_conn.execute(
+                        'DELETE FROM crowd_history WHERE building_id = ? AND ts < ?', (building_id, cutoff))
+                else:
+                    result = db_conn.execute(
+                        'DELETE FROM crowd_rollup WHERE resolution = ? AND building_id = ? AND bucket < ?',
+                        (RESOLUTIONS[name], building_id, cutoff))
+                deleted += result.rowcount
+    return deleted
+
+
+# --- History queries ---
+# The web server runs each request on a new thread, so queries share one
+# read-only connection behind a lock instead of opening one per thread
+_reader_conn = None
+_reader_lock = threading.Lock()
+
+
+def _reader():
+    """The shared read-only connection; WAL lets it read while the writer commits.
+    Caller holds _reader_lock"""
+    global _reader_conn
+    if _reader_conn is None:
+        # Create the schema once, on a throwaway connection, before the first read
+        setup = sqlite3.connect(DB_PATH)
+        try:
+            init_history(setup)
+        finally:
+            setup.close()
+        _reader_conn = sqlite3.connect(f'file:{DB_PATH}?mode=ro', uri=True, check_same_thread=False)
+    return _reader_conn
+
+
+def query_history(building_ids, start, end, resolution='hourly'):
+    """Counts for buildings between two unix timestamps at a RESOLUTIONS key.
+
+    Returns {building_id: [{ts, avg, min, max, samples}, ...]}; raw points
+    have avg == min == max.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}', expected one of {list(RESOLUTIONS)}")
+
+    history = {building_id: [] for building_id in building_ids}
+    with _reader_lock:
+        db_conn = _reader()
+        for building_id in building_ids:
+            if RESOLUTIONS[resolution] is None:
+                rows = db_conn.execute(
+                    'SELECT ts, count, count, count, 1 FROM crowd_history '
+                    'WHERE building_id = ? AND ts >= ? AND ts < ? ORDER BY ts',
+                    (building_id, start, end)).fetchall()
+            else:
+                rows = db_conn.execute(
+                    'SELECT bucket, CAST(total AS REAL) / samples, min_count, max_count, samples FROM crowd_rollup '
+                    'WHERE resolution = ? AND building_id = ? AND bucket >= ? AND bucket < ? ORDER BY bucket',
+                    (RESOLUTIONS[resolution], building_id, bucket_start(start, RESOLUTIONS[resolution]),
+                     end)).fetchall()
+            history[building_id] = [{"ts": ts, "avg": round(avg, 2), "min": low, "max": high,
+                                     "samples": samples} for ts, avg, low, high, samples in rows]
+    return history
+
+
+class HistoryWriter:
+    """Write-behind recorder for live counts.
+
+    `record()` only touches an in-memory buffer, so counting threads never
+    wait on SQLite or the SD card. A background thread flushes the buffer
+    every `flush_interval` seconds as one executemany() in a single
+    transaction, together with the rollup updates. Samples are keyed by
+    (building, whole second), so faster inference rates collapse to at most
+    one row per camera per second. If the disk stalls the oldest buffered
+    samples are dropped past `max_buffer`. Retention runs every
+    `retention_interval` seconds on the same thread.
+    """
+
+    def __init__(self, db_path=DB_PATH, flush_interval=5.0, max_buffer=100000, retention_interval=3600):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.retention_interval = retention_interval
+
+        self._buffer = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.last_flush_s = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="history-writer")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+
+    def record(self, building_id, count, ts=None):
+        key = (building_id, int(ts if ts is not None else time.time()))
+        with self._lock:
+            self._buffer[key] = int(count)
+            self._buffer.move_to_end(key)
+            while len(self._buffer) > self.max_buffer:
+                self._buffer.popitem(last=False)
+                self.rows_dropped += 1
+
+    def _take(self, final=False):
+        # Leave the current second buffered so it is never flushed (and rolled up) twice
+        current = int(time.time())
+        with self._lock:
+            rows = [(building_id, ts, count) for (building_id, ts), count in self._buffer.items()
+                    if final or ts < current]
+            for building_id, ts, _ in rows:
+                del self._buffer[(building_id, ts)]
+        return rows
+
+    def _requeue(self, rows):
+        # Put a failed batch back in front of anything recorded since
+        with self._lock:
+            merged = OrderedDict(((building_id, ts), count) for building_id, ts, count in rows)
+            merged.update(self._buffer)
+            self._buffer = merged
+            while len(self._buffer) > self.max_buffer:
+                self._buffer.popitem(last=False)
+                self.rows_dropped += 1
+
+    def _flush(self, db_conn, final=False):
+        rows = self._take(final)
+        if not rows:
+            return
+        start = time.perf_counter()
+        try:
+            with db_conn:  # one transaction per batch
+                db_conn.executemany(
+                    'INSERT OR REPLACE INTO crowd_history (building_id, ts, count) VALUES (?, ?, ?)', rows)
+                update_rollups(db_conn, rows)
+        except sqlite3.Error:
+            self._requeue(rows)
+            raise
+        self.rows_written += len(rows)
+        self.last_flush_s = time.perf_counter() - start
+
+    def _run(self):
+        # The connection lives on this thread only; queries use the shared reader
+        db_conn = sqlite3.connect(self.db_path)
+        init_history(db_conn)
+        last_retention = 0.0
+        try:
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self._flush(db_conn)
+                    if time.time() - last_retention >= self.retention_interval:
+                        last_retention = time.time()
+                        deleted = apply_retention(db_conn)
+                        if deleted:
+                            logger.info(f"History retention removed {deleted} rows")
+                except sqlite3.Error as e:
+                    logger.error(f"History flush failed: {e}")
+            self._flush(db_conn, final=True)
+        finally:
+            db_conn.close()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._buffer)
+        return {
+            "pending": pending,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "last_flush_ms": round(self.last_flush_s * 1000, 1)
+        }
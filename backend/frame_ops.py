@@ -0,0 +1,59 @@
+import threading
+
+import cv2
+
+# Where a frame-path buffer was allocated: the model input, the viewer
+# stream, a per-client stream variant or a mosaic tile
+ALLOCATION_KINDS = ('inference', 'stream', 'variant', 'mosaic')
+
+
+class FrameOpCounter:
+    """Per-camera tally of the image buffers the frame path allocates.
+
+    A camera's buffers are allocated by its worker thread and by the mosaic
+    threads showing it, so the counters are updated under a lock. Divide by
+    `frames` for the per-frame cost.
+    """
+
+    def __init__(self):
+        self._cameras = {}
+        self._lock = threading.Lock()
+
+    def _camera(self, building_id):
+        # Caller holds self._lock
+        camera = self._cameras.get(building_id)
+        if camera is None:
+            camera = dict.fromkeys(('frames', 'bytes_allocated') + ALLOCATION_KINDS, 0)
+            self._cameras[building_id] = camera
+        return camera
+
+    def frame(self, building_id):
+        with self._lock:
+            self._camera(building_id)['frames'] += 1
+
+    def allocated(self, building_id, kind, image):
+        """Record a new image buffer; `kind` is one of ALLOCATION_KINDS"""
+        with self._lock:
+            camera = self._camera(building_id)
+            camera[kind] += 1
+            camera['bytes_allocated'] += image.nbytes
+
+    def stats(self):
+        with self._lock:
+            cameras = {building_id: dict(camera) for building_id, camera in self._cameras.items()}
+        for entry in cameras.values():
+            frames = entry['frames'] or 1
+            entry['allocations_per_frame'] = round(sum(entry[kind] for kind in ALLOCATION_KINDS) / frames, 3)
+            entry['bytes_per_frame'] = round(entry['bytes_allocated'] / frames)
+        return cameras
+
+
+def fit_width(image, max_width, counter=None, building_id=None, kind='stream'):
+    """(image, scale): the image itself when it fits, else one downscaled copy"""
+    if not max_width or image.shape[1] <= max_width:
+        return image, 1.0
+    scale = max_width / image.shape[1]
+    resized = cv2.resize(image, (max_width, int(image.shape[0] * scale)))
+    if counter is not None:
+        counter.allocated(building_id, kind, resized)
+    return resized, scale
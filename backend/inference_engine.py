@@ -0,0 +1,156 @@
+import threading
+import queue
+import time
+import logging
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceRequest:
+    """A frame waiting for a batched forward pass"""
+
+    def __init__(self, building_id, frame):
+        self.building_id = building_id
+        self.frame = frame
+        self.submitted_at = time.time()
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def set_result(self, result):
+        self.result = result
+        self._done.set()
+
+    def set_error(self, error):
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Block until the batch containing this frame has run; returns (count, boxes)"""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Inference for {self.building_id} timed out")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class BatchInferenceEngine:
+    """Gathers frames from many cameras into one forward pass.
+
+    Camera workers call `infer()` (or `submit()` + `wait()`) with a single
+    frame. A background thread takes the first pending frame, keeps
+    collecting until `max_batch_size` frames are queued or `max_wait` seconds
+    have passed, runs `crowd_counter.count_batch()` once and hands every
+    camera its own (count, boxes). Throughput is tracked per batch size.
+    """
+
+    def __init__(self, crowd_counter, max_batch_size=8, max_wait=0.02):
+        self.crowd_counter = crowd_counter
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self.batch_latency = Histogram()
+        self.queue_wait = Histogram()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="batch-inference")
+            self._thread.start()
+            logger.info(f"Batch inference engine started (max batch {self.max_batch_size}, "
+                        f"max wait {self.max_wait * 1000:.0f} ms)")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def submit(self, building_id, frame):
+        request = InferenceRequest(building_id, frame)
+        self._queue.put(request)
+        return request
+
+    @property
+    def pending(self):
+        """Frames queued for the next batch"""
+        return self._queue.qsize()
+
+    def infer(self, building_id, frame, timeout=10.0):
+        """Submit one frame and wait for its (count, boxes)"""
+        return self.submit(building_id, frame).wait(timeout)
+
+    def _collect_batch(self):
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            start = time.time()
+            try:
+                outputs = self.crowd_counter.count_batch([request.frame for request in batch])
+            except Exception as e:
+                logger.error(f"Batched inference failed for {len(batch)} frames: {e}")
+                for request in batch:
+                    request.set_error(e)
+                continue
+            elapsed = time.time() - start
+
+            for request, output in zip(batch, outputs):
+                request.set_result(output)
+            self.batch_latency.observe(elapsed)
+            for request in batch:
+                self.queue_wait.observe(start - request.submitted_at)
+
+            self._record(len(batch), elapsed, sum(start - request.submitted_at for request in batch))
+
+    def _record(self, batch_size, elapsed, queue_wait):
+        with self._stats_lock:
+            entry = self._stats.setdefault(batch_size, {'batches': 0, 'frames': 0,
+                                                        'inference_time': 0.0, 'queue_wait': 0.0})
+            entry['batches'] += 1
+            entry['frames'] += batch_size
+            entry['inference_time'] += elapsed
+            entry['queue_wait'] += queue_wait
+
+    def stats(self):
+        """Throughput (frames per second of forward-pass time) for each batch size seen"""
+        with self._stats_lock:
+            stats = {size: dict(entry) for size, entry in self._stats.items()}
+
+        report = {}
+        for size, entry in sorted(stats.items()):
+            report[size] = {
+                "batches": entry['batches'],
+                "frames": entry['frames'],
+                "fps": round(entry['frames'] / entry['inference_time'], 1) if entry['inference_time'] > 0 else 0,
+                "avg_batch_ms": round(entry['inference_time'] / entry['batches'] * 1000, 1),
+                "avg_queue_wait_ms": round(entry['queue_wait'] / entry['frames'] * 1000, 1)
+            }
+        return report
@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceScheduler:
+    """Shares a global inferences-per-second budget between the active cameras.
+
+    Every camera gets a weight of 1, plus bonuses for:
+      * volatility   - spread of its recent counts relative to capacity
+      * occupancy    - how close the latest count is to `max_capacity`
+      * viewed       - someone has the MJPEG stream open
+    The budget is split in proportion to the weights and each rate is
+    clamped to [min_rate, max_rate]; budget freed by the clamp is handed to
+    the remaining cameras. When the cameras' minimums alone would exceed
+    the budget, the minimum is lowered to half of an equal share, so the
+    total stays within budget and the weights still decide the rest. Rates are recomputed every `update_interval`
+    seconds from the camera workers' calls to `due()`.
+    """
+
+    def __init__(self, budget=10.0, min_rate=0.1, max_rate=5.0, history=20, update_interval=2.0,
+                 volatility_weight=4.0, occupancy_weight=3.0, viewed_weight=2.0, idle_after=10.0):
+        self.budget = budget
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.update_interval = update_interval
+        self.volatility_weight = volatility_weight
+        self.occupancy_weight = occupancy_weight
+        self.viewed_weight = viewed_weight
+        self.idle_after = idle_after
+        self.effective_min_rate = min_rate
+
+        self._lock = threading.Lock()
+        self._history_size = history
+        self._cameras = {}
+        self._last_update = 0.0
+
+    def _camera(self, building_id):
+        camera = self._cameras.get(building_id)
+        if camera is None:
+            camera = {'counts': deque(maxlen=self._history_size), 'capacity': 0, 'viewed': False,
+                      'last_seen': 0.0, 'last_inference': 0.0, 'rate': self.min_rate,
+                      'weight': 1.0, 'volatility': 0.0, 'occupancy': 0.0, 'skipped': 0}
+            self._cameras[building_id] = camera
+        return camera
+
+    def due(self, building_id, viewed=False):
+        """True when a camera should run inference on the frame it just captured"""
+        now = time.time()
+        with self._lock:
+            camera = self._camera(building_id)
+            camera['viewed'] = viewed
+            camera['last_seen'] = now
+            if now - self._last_update >= self.update_interval:
+                self._rebalance(now)
+
+            if now - camera['last_inference'] >= 1.0 / camera['rate']:
+                camera['last_inference'] = now
+                return True
+            camera['skipped'] += 1
+            return False
+
+    def is_due(self, building_id):
+        """Whether due() would return True now, without using the slot up; counts as
+        seeing the camera, so one that skips decoding its frames stays active"""
+        now = time.time()
+        with self._lock:
+            camera = self._camera(building_id)
+            camera['last_seen'] = now
+            return now - camera['last_inference'] >= 1.0 / camera['rate']
+
+    def record(self, building_id, count, capacity):
+        """Feed back the count produced by an inference"""
+        with self._lock:
+            camera = self._camera(building_id)
+            camera['counts'].append(count)
+            camera['capacity'] = capacity
+
+    def _rebalance(self, now):
+        # Caller holds self._lock
+        self._last_update = now
+        active = [building_id for building_id, camera in self._cameras.items()
+                  if now - camera['last_seen'] < self.idle_after]
+        if not active:
+            return
+
+        cameras = [self._cameras[building_id] for building_id in active]
+        capacity = np.array([max(camera['capacity'], 1) for camera in cameras], dtype=np.float64)
+        volatility = np.array([np.std(camera['counts']) if len(camera['counts']) > 1 else 0.0
+                               for camera in cameras]) / capacity
+        occupancy = np.array([camera['counts'][-1] if camera['counts'] else 0 for camera in cameras]) / capacity
+        viewed = np.array([camera['viewed'] for camera in cameras], dtype=np.float64)
+
+        # A spread of 10% of capacity, or occupancy from 50% up to full, earns the whole bonus
+        weights = (1.0
+                   + self.volatility_weight * np.clip(volatility * 10, 0, 1)
+                   + self.occupancy_weight * np.clip((occupancy - 0.5) * 2, 0, 1)
+                   + self.viewed_weight * viewed)
+        rates = self._allocate(weights)
+
+        for camera, weight, rate, vol, occ in zip(cameras, weights, rates, volatility, occupancy):
+            camera['weight'] = float(weight)
+            camera['rate'] = float(rate)
+            camera['volatility'] = float(vol)
+            camera['occupancy'] = float(occ)
+
+    def _allocate(self, weights):
+        """Proportional split of the budget, water-filled around the rate limits"""
+        rates = np.zeros_like(weights)
+        free = np.ones(len(weights), dtype=bool)
+        budget = self.budget
+
+        min_rate = self.min_rate
+        if len(weights) * min_rate > budget:
+            min_rate = 0.5 * budget / len(weights)
+        if min_rate != self.effective_min_rate:
+            if min_rate < self.min_rate:
+                logger.warning(f"{len(weights)} cameras x min rate {self.min_rate}/s exceeds the budget of "
+                               f"{budget}/s; lowering the minimum to {min_rate:.3f}/s")
+            self.effective_min_rate = min_rate
+
+        # Fix cameras whose share falls below the minimum first (they take
+        # more than their share), then those above the maximum (they give some
+        # back), re-splitting what is left each time; the minimums fit the
+        # budget, so the total never exceeds it
+        while free.any():
+            free_idx = np.flatnonzero(free)
+            share = budget * weights[free_idx] / weights[free_idx].sum()
+            for pinned, limit in ((share < min_rate, min_rate), (share > self.max_rate, self.max_rate)):
+                if pinned.any():
+                    rates[free_idx[pinned]] = limit
+                    free[free_idx[pinned]] = False
+                    budget = max(budget - limit * pinned.sum(), 0.0)
+                    break
+            else:
+                rates[free_idx] = share
+                break
+
+        return rates
+
+    def decisions(self):
+        """Current per-camera rate and the inputs behind it"""
+        now = time.time()
+        with self._lock:
+            report = {}
+            for building_id, camera in self._cameras.items():
+                report[building_id] = {
+                    "rate": round(camera['rate'], 3),
+                    "interval_s": round(1.0 / camera['rate'], 2),
+                    "weight": round(camera['weight'], 2),
+                    "volatility": round(camera['volatility'], 3),
+                    "occupancy": round(camera['occupancy'], 3),
+                    "viewed": camera['viewed'],
+                    "skipped": camera['skipped'],
+                    "active": now - camera['last_seen'] < self.idle_after
+                }
+            return report
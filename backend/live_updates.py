@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+
+
+def sse_event(event, data, event_id=None):
+    """Format one Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class LiveUpdateHub:
+    """Versioned per-building state pushed to dashboards over SSE.
+
+    The counting loop calls `publish()` whenever it updates a building; the
+    call is a no-op unless something other than `ignore_keys` changed. Every
+    real change bumps a global version. A connected client remembers the
+    last version it sent and, when woken, sends only the buildings changed
+    since then, so bursts of updates coalesce and server work follows the
+    rate of count changes rather than clients x poll rate. New and
+    reconnecting clients start with a full snapshot; idle connections get
+    a heartbeat every `heartbeat` seconds.
+    """
+
+    def __init__(self, heartbeat=15.0, retry_ms=3000, ignore_keys=('last_updated',)):
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self.ignore_keys = set(ignore_keys)
+
+        self._cond = threading.Condition()
+        self._version = 0
+        self._entries = {}
+        self._clients = 0
+
+    def _significant(self, payload):
+        return {key: value for key, value in payload.items() if key not in self.ignore_keys}
+
+    def publish(self, building_id, payload):
+        """Record a building's latest payload; returns True if it changed"""
+        with self._cond:
+            current = self._entries.get(building_id)
+            if current is not None and self._significant(current[1]) == self._significant(payload):
+                return False
+            self._version += 1
+            self._entries[building_id] = (self._version, payload)
+            self._cond.notify_all()
+            return True
+
+    @property
+    def version(self):
+        with self._cond:
+            return self._version
+
+    @property
+    def clients(self):
+        with self._cond:
+            return self._clients
+
+    def snapshot(self):
+        with self._cond:
+            return self._version, {building_id: payload for building_id, (_, payload) in self._entries.items()}
+
+    def changes_since(self, version, timeout):
+        """Wait up to `timeout` for changes after `version`; returns (new_version, changed)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version > version, timeout=timeout)
+            changed = {building_id: payload for building_id, (entry_version, payload) in self._entries.items()
+                       if entry_version > version}
+            return self._version, changed
+
+    def stream(self):
+        """SSE generator for one client: snapshot, then deltas and heartbeats"""
+        with self._cond:
+            self._clients += 1
+        try:
+            version, buildings = self.snapshot()
+            yield f"retry: {self.retry_ms}\n\n"
+            yield sse_event('snapshot', {"version": version, "buildings": buildings}, version)
+
+            while True:
+                new_version, changed = self.changes_since(version, self.heartbeat)
+                if changed:
+                    version = new_version
+                    yield sse_event('delta', {"version": version, "buildings": changed}, version)
+                else:
+                    yield sse_event('heartbeat', {"version": version, "ts": time.time()})
+        finally:
+            with self._cond:
+                self._clients -= 1
@@ -0,0 +1,83 @@
+import bisect
+
+# Seconds; spans a fast JPEG encode up to a slow CPU forward pass
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram for the Prometheus text format.
+
+    `observe()` is a bisect and three additions with no lock: each instance
+    is meant to be written by a single thread (one camera worker, the
+    inference thread), which keeps instrumentation off the hot path's
+    critical sections. Scrapes read the counters as they are.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+class MetricsText:
+    """Builds one Prometheus text-format exposition at scrape time.
+
+    Each call adds a metric family from (labels dict, value) samples; the
+    values are read from the components' own counters, so nothing is
+    aggregated until someone scrapes.
+    """
+
+    def __init__(self, prefix='crowd_'):
+        self.prefix = prefix
+        self._lines = []
+
+    def _header(self, name, metric_type, help_text):
+        self._lines.append(f"# HELP {self.prefix}{name} {help_text}")
+        self._lines.append(f"# TYPE {self.prefix}{name} {metric_type}")
+
+    def counter(self, name, help_text, samples):
+        self._header(name, 'counter', help_text)
+        for labels, value in samples:
+            self._lines.append(f"{self.prefix}{name}{_labels(labels)} {_number(value)}")
+
+    def gauge(self, name, help_text, samples):
+        self._header(name, 'gauge', help_text)
+        for labels, value in samples:
+            self._lines.append(f"{self.prefix}{name}{_labels(labels)} {_number(value)}")
+
+    def histogram(self, name, help_text, samples):
+        self._header(name, 'histogram', help_text)
+        for labels, histogram in samples:
+            counts = list(histogram.counts)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), counts):
+                cumulative += count
+                self._lines.append(f"{self.prefix}{name}_bucket{_labels(labels, {'le': _number(float(bound))})} "
+                                   f"{cumulative}")
+            self._lines.append(f"{self.prefix}{name}_sum{_labels(labels)} {_number(float(histogram.sum))}")
+            self._lines.append(f"{self.prefix}{name}_count{_labels(labels)} {cumulative}")
+
+    def render(self):
+        return '\n'.join(self._lines) + '\n'
@@ -0,0 +1,240 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+from metrics import Histogram
+
+
+def mjpeg_chunk(frame_bytes):
+    """Wrap JPEG bytes (or the encoder's buffer) in a multipart/x-mixed-replace part"""
+    return b''.join((b'--frame\r\nContent-Type: image/jpeg\r\n\r\n', frame_bytes, b'\r\n'))
+
+
+# --- Stream variants ---
+# Requested width / fps / quality are snapped down to these steps so clients
+# asking for similar streams share one encoded variant per camera; a value
+# below the smallest step is rejected rather than raised to it
+VARIANT_WIDTHS = (320, 480, 640, 960, 1280)
+VARIANT_FPS = (1, 2, 5, 10, 15)
+VARIANT_QUALITIES = (40, 50, 60, 75, 85)
+
+# A frame whose 64x36 grey thumbnail differs from the last one sent by no more
+# than this (per pixel, 0-255) is not re-encoded; resent anyway after MAX_UNCHANGED s
+CHANGE_THUMBNAIL = (64, 36)
+CHANGE_THRESHOLD = 4
+MAX_UNCHANGED = 5.0
+
+# max_width, fps and quality of None mean the source width, every frame and the
+# broadcaster's own jpeg_quality
+StreamVariant = namedtuple('StreamVariant', ['max_width', 'fps', 'quality'])
+DEFAULT_VARIANT = StreamVariant(None, None, None)
+
+
+def _snap(name, value, steps):
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer, got {value!r}") from None
+    if value < steps[0]:
+        raise ValueError(f"{name} must be at least {steps[0]}, got {value}")
+    return max(step for step in steps if step <= value)
+
+
+def stream_variant(width=None, fps=None, quality=None):
+    """StreamVariant for a client's requested limits (ints or raw query strings), snapped
+    to the shared steps; raises ValueError for a malformed limit or one below the smallest step"""
+    return StreamVariant(_snap('width', width, VARIANT_WIDTHS), _snap('fps', fps, VARIANT_FPS),
+                         _snap('quality', quality, VARIANT_QUALITIES))
+
+
+class FrameSubscriber:
+    """One viewer's bounded queue of encoded chunks; the oldest is dropped when full"""
+
+    def __init__(self, max_queue, variant=DEFAULT_VARIANT):
+        self.queue = deque(maxlen=max_queue)
+        self.variant = variant
+        self.dropped = 0
+
+
+class _VariantState:
+    """Subscribers and send history of one StreamVariant"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_chunk = None
+        self.next_due = 0.0
+        self.thumbnail = None
+        self.sent_at = 0.0
+
+
+class MJPEGBroadcaster:
+    """Encodes each output frame of a camera once per stream variant and fans the bytes out.
+
+    `publish()` runs on the camera worker thread and never blocks on a
+    viewer: every subscriber has its own deque of at most `queue_size`
+    chunks, so a browser on a slow link only loses its own oldest frames
+    instead of stalling capture, inference or the other viewers.
+
+    Viewers may subscribe to a smaller, slower or lower quality
+    StreamVariant (see `stream_variant()`). Each variant with viewers is
+    resized and encoded once per published frame it is due for, and at
+    most `max_variants` exist at a time; further variants fall back to the
+    default one. A frame that looks the same as the last one a variant
+    sent (CHANGE_THRESHOLD on a small grey thumbnail) is not encoded or
+    sent again, so a static scene costs almost nothing to stream.
+    """
+
+    def __init__(self, jpeg_quality=None, queue_size=2, max_variants=8, frame_counter=None, building_id=None):
+        self.jpeg_quality = jpeg_quality
+        self.queue_size = queue_size
+        self.max_variants = max_variants
+        # Optional FrameOpCounter credited with the variant resizes
+        self.frame_counter = frame_counter
+        self.building_id = building_id
+
+        self._cond = threading.Condition()
+        self._variants = {}
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+        self.frames_unchanged = 0
+        self.frames_throttled = 0
+        self.encode_time = Histogram()
+
+    def subscribe(self, variant=DEFAULT_VARIANT):
+        with self._cond:
+            if variant not in self._variants and len(self._variants) >= self.max_variants:
+                variant = DEFAULT_VARIANT
+            state = self._variants.get(variant)
+            if state is None:
+                state = self._variants[variant] = _VariantState()
+            subscriber = FrameSubscriber(self.queue_size, variant)
+            # Start new viewers on the latest frame instead of a blank wait
+            if state.last_chunk is not None:
+                subscriber.queue.append(state.last_chunk)
+            state.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._cond:
+            state = self._variants.get(subscriber.variant)
+            if state is not None:
+                state.subscribers.discard(subscriber)
+                if not state.subscribers:
+                    del self._variants[subscriber.variant]
+
+    def reset(self):
+        """Forget the last frame, e.g. when the camera loop restarts"""
+        with self._cond:
+            for state in self._variants.values():
+                state.last_chunk = None
+                state.thumbnail = None
+
+    @property
+    def subscriber_count(self):
+        with self._cond:
+            return sum(len(state.subscribers) for state in self._variants.values())
+
+    def _due(self, variant, state, thumbnail, now, final):
+        """Whether a variant sends this frame; counts the frames it skips"""
+        if final:
+            return True
+        if variant.fps and now < state.next_due:
+            self.frames_throttled += 1
+            return False
+        if (state.thumbnail is not None and now - state.sent_at < MAX_UNCHANGED
+                and cv2.absdiff(thumbnail, state.thumbnail).max() <= CHANGE_THRESHOLD):
+            self.frames_unchanged += 1
+            return False
+        return True
+
+    def publish(self, frame, final=False):
+        """Encode `frame` once for every variant that is due and queue it for its subscribers"""
+        with self._cond:
+            if not self._variants:
+                return
+            variants = list(self._variants.items())
+
+        now = time.perf_counter()
+        thumbnail = cv2.resize(frame, CHANGE_THUMBNAIL, interpolation=cv2.INTER_AREA)
+        if thumbnail.ndim == 3:
+            thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+
+        resized = {}
+        encoded = []
+        for variant, state in variants:
+            if not self._due(variant, state, thumbnail, now, final):
+                continue
+
+            # Variants of the same width share one resize; never scale up
+            width = variant.max_width if variant.max_width and variant.max_width < frame.shape[1] else None
+            image = resized.get(width)
+            if image is None:
+                image = frame if width is None else cv2.resize(
+                    frame, (width, int(frame.shape[0] * width / frame.shape[1])), interpolation=cv2.INTER_AREA)
+                if width is not None and self.frame_counter is not None:
+                    self.frame_counter.allocated(self.building_id, 'variant', image)
+                resized[width] = image
+
+            quality = variant.quality or self.jpeg_quality
+            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality] if quality else []
+            start = time.perf_counter()
+            _, buffer = cv2.imencode('.jpg', image, encode_param)
+            self.encode_time.observe(time.perf_counter() - start)
+            encoded.append((state, (mjpeg_chunk(buffer), final)))
+
+            state.thumbnail = thumbnail
+            state.sent_at = now
+            if variant.fps:
+                state.next_due = max(state.next_due + 1.0 / variant.fps, now)
+
+        if not encoded:
+            return
+        with self._cond:
+            for state, item in encoded:
+                self.frames_encoded += 1
+                state.last_chunk = item
+                for subscriber in state.subscribers:
+                    if len(subscriber.queue) == subscriber.queue.maxlen:
+                        subscriber.dropped += 1
+                        self.frames_dropped += 1
+                    subscriber.queue.append(item)
+            self._cond.notify_all()
+
+    def get(self, subscriber, timeout=1.0):
+        """Pop the next (chunk, final) for a subscriber, or None on timeout"""
+        with self._cond:
+            if not subscriber.queue:
+                self._cond.wait_for(lambda: len(subscriber.queue) > 0, timeout=timeout)
+            if subscriber.queue:
+                return subscriber.queue.popleft()
+            return None
+
+    def stream(self, subscriber):
+        """Yield multipart chunks for a subscriber until the final frame"""
+        while True:
+            item = self.get(subscriber)
+            if item is None:
+                continue
+            chunk, final = item
+            yield chunk
+            if final:
+                break
+
+    def stats(self):
+        with self._cond:
+            subscribers = [subscriber for state in self._variants.values() for subscriber in state.subscribers]
+            return {
+                "subscribers": len(subscribers),
+                "frames_encoded": self.frames_encoded,
+                "frames_dropped": self.frames_dropped,
+                "frames_unchanged": self.frames_unchanged,
+                "frames_throttled": self.frames_throttled,
+                "queue_depths": [len(subscriber.queue) for subscriber in subscribers],
+                "variants": {f"{variant.max_width or 'full'}w-{variant.fps or 'all'}fps-"
+                             f"q{variant.quality or self.jpeg_quality or 'default'}": len(state.subscribers)
+                             for variant, state in self._variants.items()}
+            }
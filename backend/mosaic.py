@@ -0,0 +1,122 @@
+import math
+import threading
+import time
+import logging
+
+import cv2
+import numpy as np
+
+from mjpeg_broadcaster import MJPEGBroadcaster
+
+logger = logging.getLogger(__name__)
+
+
+class MosaicStream:
+    """One MJPEG stream tiling the latest frame of many cameras, for wall screens.
+
+    A compositor thread wakes `fps` times a second, shrinks each camera
+    worker's latest frame into its tile of a reused canvas, lets
+    `decorate(building_id, tile, scale)` draw boxes and labels, and hands
+    the canvas to an MJPEGBroadcaster - so the grid is encoded once per
+    tick however many screens show it. Tiles only read frames the workers
+    already captured; `keep_alive()` keeps a worker running while it is on
+    a wall, without marking it as viewed, and `request_frame()` has it
+    decode a frame for the next tick. The thread starts with the first
+    screen and stops `idle_timeout` seconds after the last one leaves.
+    """
+
+    def __init__(self, worker_pool, building_ids, columns=None, tile_size=(320, 180), fps=2.0,
+                 jpeg_quality=75, decorate=None, labels=None, idle_timeout=5.0, frame_counter=None):
+        self.worker_pool = worker_pool
+        self.building_ids = list(building_ids)
+        self.columns = columns or math.ceil(math.sqrt(len(self.building_ids)))
+        self.rows = math.ceil(len(self.building_ids) / self.columns)
+        self.tile_size = tile_size
+        self.fps = fps
+        self.decorate = decorate
+        self.labels = labels or {}
+        self.idle_timeout = idle_timeout
+        self.frame_counter = frame_counter
+        self.broadcaster = MJPEGBroadcaster(jpeg_quality=jpeg_quality, queue_size=1)
+
+        tile_width, tile_height = tile_size
+        self._canvas = np.zeros((self.rows * tile_height, self.columns * tile_width, 3), dtype=np.uint8)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.frames_composed = 0
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="mosaic")
+                self._thread.start()
+
+    def stream(self):
+        """Yield multipart chunks of the grid for one screen"""
+        subscriber = self.broadcaster.subscribe()
+        self._ensure_running()
+        try:
+            yield from self.broadcaster.stream(subscriber)
+        finally:
+            self.broadcaster.unsubscribe(subscriber)
+
+    def _tile(self, index):
+        tile_width, tile_height = self.tile_size
+        row, column = divmod(index, self.columns)
+        return self._canvas[row * tile_height:(row + 1) * tile_height,
+                            column * tile_width:(column + 1) * tile_width]
+
+    def compose(self):
+        """Redraw every tile from the workers' latest frames; returns the canvas"""
+        tile_width, tile_height = self.tile_size
+        for index, building_id in enumerate(self.building_ids):
+            worker = self.worker_pool.get(building_id)
+            worker.keep_alive()
+            worker.request_frame()
+            tile = self._tile(index)
+            latest = worker.latest()
+
+            if latest is None or latest.final or worker.status != 'online':
+                tile[:] = 40
+                cv2.putText(tile, worker.status.upper(), (10, tile_height // 2 + 20),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                scale = None
+            else:
+                # Letterbox into the tile, writing straight into the canvas
+                frame = latest.frame
+                scale = min(tile_width / frame.shape[1], tile_height / frame.shape[0])
+                width, height = int(frame.shape[1] * scale), int(frame.shape[0] * scale)
+                tile[:] = 0
+                resized = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                tile[:height, :width] = resized
+                if self.frame_counter is not None:
+                    self.frame_counter.allocated(building_id, 'mosaic', resized)
+                if self.decorate is not None:
+                    self.decorate(building_id, tile, scale)
+
+            label = self.labels.get(building_id, building_id)
+            cv2.putText(tile, label, (6, 18), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+            cv2.rectangle(tile, (0, 0), (tile_width - 1, tile_height - 1), (80, 80, 80), 1)
+
+        self.frames_composed += 1
+        return self._canvas
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        last_viewer = time.time()
+        while True:
+            start = time.time()
+            if self.broadcaster.subscriber_count:
+                last_viewer = start
+            elif start - last_viewer > self.idle_timeout:
+                with self._lock:
+                    # Re-checked under the lock so a screen joining now restarts the thread
+                    if not self.broadcaster.subscriber_count:
+                        self._thread = None
+                        return
+
+            try:
+                self.broadcaster.publish(self.compose())
+            except Exception as e:
+                logger.error(f"Mosaic frame failed: {e}")
+            time.sleep(max(0.0, interval - (time.time() - start)))
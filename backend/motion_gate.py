@@ -0,0 +1,81 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Skips inference for cameras whose scene has not changed.
+
+    Each frame is shrunk to a small blurred grayscale thumbnail and compared
+    with the thumbnail of the last frame that was actually inferred. If
+    fewer than `min_changed_ratio` of its pixels moved by more than
+    `pixel_threshold` grey levels, the caller can reuse the previous count
+    and boxes. A full inference is forced at least every `heartbeat`
+    seconds so slow drift (lighting, people standing still) is never missed.
+    """
+
+    def __init__(self, size=(160, 90), pixel_threshold=25, min_changed_ratio=0.003, heartbeat=30.0):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.heartbeat = heartbeat
+
+        self._lock = threading.Lock()
+        self._references = {}
+        self._last_inferred = {}
+        self._stats = {}
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def should_infer(self, building_id, frame):
+        """True when the frame needs a fresh inference; records skip statistics"""
+        thumbnail = self._thumbnail(frame)
+        now = time.time()
+
+        with self._lock:
+            stats = self._stats.setdefault(building_id, {'checked': 0, 'inferred': 0, 'skipped': 0,
+                                                         'heartbeats': 0, 'changed_ratio': 0.0})
+            stats['checked'] += 1
+            reference = self._references.get(building_id)
+
+            if reference is None:
+                changed_ratio, changed, forced = 1.0, True, False
+            else:
+                diff = cv2.absdiff(thumbnail, reference)
+                changed_ratio = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+                changed = changed_ratio >= self.min_changed_ratio
+                forced = not changed and now - self._last_inferred.get(building_id, 0) >= self.heartbeat
+
+            stats['changed_ratio'] = changed_ratio
+            if not (changed or forced):
+                stats['skipped'] += 1
+                return False
+
+            stats['inferred'] += 1
+            if forced:
+                stats['heartbeats'] += 1
+            self._references[building_id] = thumbnail
+            self._last_inferred[building_id] = now
+            return True
+
+    def reset(self, building_id):
+        """Force the next frame of a camera through inference"""
+        with self._lock:
+            self._references.pop(building_id, None)
+
+    def stats(self):
+        """Per-camera counters and the share of inferences that were skipped"""
+        with self._lock:
+            report = {}
+            for building_id, stats in self._stats.items():
+                entry = dict(stats)
+                entry['changed_ratio'] = round(entry['changed_ratio'], 4)
+                entry['skip_ratio'] = round(entry['skipped'] / entry['checked'], 3) if entry['checked'] else 0.0
+                report[building_id] = entry
+            return report
@@ -0,0 +1,337 @@
+import contextlib
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from inference_engine import BatchInferenceEngine, InferenceRequest
+
+logger = logging.getLogger(__name__)
+
+
+_main_module_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _main_module_hidden():
+    """Hide the main module's name and path from spawn's preparation data, so a
+    child started inside this block does not re-run it as __mp_main__"""
+    main_module = sys.modules['__main__']
+    with _main_module_lock:
+        saved = {key: main_module.__dict__[key] for key in ('__spec__', '__file__') if key in main_module.__dict__}
+        main_module.__spec__ = None
+        main_module.__dict__.pop('__file__', None)
+        try:
+            yield
+        finally:
+            main_module.__dict__.update(saved)
+
+
+def slot_view(block, slot, slot_bytes, shape):
+    """uint8 frame of `shape` backed by a ring slot, without copying"""
+    return np.ndarray(shape, dtype=np.uint8, buffer=block.buf, offset=slot * slot_bytes)
+
+
+def _inference_worker(index, core, model_path, backend, shm_name, slot_bytes, tasks, results,
+                      max_batch_size, max_wait, threads):
+    """Process entry point: one model, fed with ring slots, batches sent back on `results`"""
+    if core is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {core})
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    import cv2
+    cv2.setNumThreads(threads)
+    from crowd_counter import CrowdCounter
+
+    try:
+        counter = CrowdCounter(model_path=model_path, backend=backend, warmup_batch=max_batch_size)
+    except Exception as e:
+        results.put(('failed', index, str(e)))
+        return
+
+    # Spawned children share the parent's resource tracker, so attaching does
+    # not hand ownership over: the parent still unlinks the block in stop()
+    block = shared_memory.SharedMemory(name=shm_name)
+    results.put(('ready', index, dict(counter.startup_report, core=core, pid=os.getpid())))
+
+    stopping = False
+    while not stopping:
+        task = tasks.get()
+        if task is None:
+            break
+
+        batch = [task]
+        deadline = time.time() + max_wait
+        while len(batch) < max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                task = tasks.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if task is None:
+                stopping = True
+                break
+            batch.append(task)
+
+        frames = [slot_view(block, slot, slot_bytes, shape) if slot is not None else frame
+                  for _, slot, shape, frame in batch]
+        start = time.time()
+        try:
+            items = [(request_id, count, boxes, None)
+                     for (request_id, _, _, _), (count, boxes) in zip(batch, counter.count_batch(frames))]
+        except Exception as e:
+            items = [(request_id, None, None, str(e)) for request_id, _, _, _ in batch]
+        elapsed = time.time() - start
+        del frames
+        results.put(('batch', index, start, elapsed, items))
+
+    block.close()
+
+
+class ProcessInferenceEngine(BatchInferenceEngine):
+    """BatchInferenceEngine whose model runs in a pool of worker processes.
+
+    Each process loads its own model, is pinned to one core and batches
+    frames the same way the threaded engine does, so model and OpenCV work
+    no longer competes for the web process's GIL. Capture threads copy a
+    frame once into a free slot of a `multiprocessing.shared_memory` ring
+    and send only (request id, slot, shape) down the task queue of the
+    worker with the fewest outstanding frames; the worker reads the slot in
+    place and returns (count, boxes) on a result queue, whose collector
+    thread frees the slot and wakes the caller.
+    Frames larger than a slot, or submitted when every slot is busy for
+    `slot_wait` seconds, are pickled instead.
+
+    The collector also expires requests still unanswered after
+    `request_timeout` seconds, failing them and freeing their slots, so a
+    stuck worker cannot leak the ring. A late result for an expired request
+    is dropped. Worker processes that died (crashed, or could not load the
+    model) are restarted with a fresh task queue - a process killed inside
+    `get()` can leave its queue locked - at most once per `restart_delay`
+    seconds each, and the frames they held are failed straight away.
+
+    The spawn start method would re-import the main module in every worker
+    as __mp_main__, running all of gpuapp's setup (model load, camera
+    workers, database) again; workers are started with the main module
+    hidden, so they only import this module and crowd_counter. The worker
+    entry point must therefore stay in an importable module, not __main__.
+    """
+
+    def __init__(self, model_path, backend='torch', processes=2, max_batch_size=8, max_wait=0.02,
+                 slot_shape=(640, 640, 3), slots=None, cores=None, threads_per_process=1,
+                 slot_wait=1.0, request_timeout=10.0, restart_delay=5.0):
+        super().__init__(None, max_batch_size=max_batch_size, max_wait=max_wait)
+        self.model_path = model_path
+        self.backend = backend
+        self.processes = processes
+        self.slot_bytes = int(np.prod(slot_shape))
+        self.slots = slots or processes * max_batch_size * 2
+        self.threads_per_process = threads_per_process
+        self.slot_wait = slot_wait
+        self.request_timeout = request_timeout
+        self.restart_delay = restart_delay
+        if cores is None:
+            cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else [None]
+        self.cores = list(cores)
+
+        self.startup_reports = {}
+        self.frames_pickled = 0
+        self.frames_copied = 0
+        self.requests_expired = 0
+        self.worker_restarts = 0
+        self._ids = itertools.count()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._free_slots = queue.Queue()
+        self._block = None
+        self._tasks = []
+        self._outstanding = []
+        self._results = None
+        self._context = None
+        self._workers = []
+        self._started_at = []
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._context = multiprocessing.get_context('spawn')
+        self._block = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        for slot in range(self.slots):
+            self._free_slots.put(slot)
+        self._results = self._context.Queue()
+
+        self._tasks = [None] * self.processes
+        self._outstanding = [0] * self.processes
+        self._workers = [self._spawn(index) for index in range(self.processes)]
+        self._started_at = [time.time()] * self.processes
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="inference-results")
+        self._thread.start()
+        logger.info(f"Started {self.processes} inference processes on cores {self.cores[:self.processes]} "
+                    f"({self.slots} shared frame slots of {self.slot_bytes // 1024} KiB)")
+        return self
+
+    def _spawn(self, index):
+        core = self.cores[index % len(self.cores)]
+        self._tasks[index] = self._context.Queue()
+        process = self._context.Process(
+            target=_inference_worker, daemon=True, name=f"inference-{index}",
+            args=(index, core, self.model_path, self.backend, self._block.name, self.slot_bytes,
+                  self._tasks[index], self._results, self.max_batch_size, self.max_wait,
+                  self.threads_per_process))
+        with _main_module_hidden():
+            process.start()
+        return process
+
+    def _restart_dead_workers(self):
+        now = time.time()
+        for index, process in enumerate(self._workers):
+            if self._stop.is_set():
+                return
+            if process.is_alive() or now - self._started_at[index] < self.restart_delay:
+                continue
+            logger.error(f"Inference process {index} exited with code {process.exitcode}, restarting")
+            self.startup_reports.pop(index, None)
+            with self._inflight_lock:
+                old_tasks = self._tasks[index]
+                self._workers[index] = self._spawn(index)
+            old_tasks.close()
+            self._started_at[index] = now
+            self.worker_restarts += 1
+            lost = self._take(lambda request, worker: worker == index)
+            self._fail(lost, f"Inference process {index} died")
+
+    def _take(self, predicate):
+        """Remove and return the in-flight entries matching predicate(request, worker)"""
+        with self._inflight_lock:
+            taken = [(request_id, entry) for request_id, entry in self._inflight.items()
+                     if predicate(entry[0], entry[2])]
+            for request_id, (_, _, worker) in taken:
+                del self._inflight[request_id]
+                self._outstanding[worker] -= 1
+        return [entry for _, entry in taken]
+
+    def _fail(self, entries, message):
+        for request, slot, _ in entries:
+            if slot is not None:
+                self._free_slots.put(slot)
+            request.set_error(TimeoutError(f"{message}; no result for {request.building_id}"))
+        if entries:
+            self.requests_expired += len(entries)
+            logger.warning(f"{message}: failed {len(entries)} unanswered inference requests")
+
+    def _expire_requests(self):
+        """Fail requests nobody answered within request_timeout and give their slots back"""
+        deadline = time.time() - self.request_timeout
+        expired = self._take(lambda request, worker: request.submitted_at < deadline)
+        self._fail(expired, f"No result within {self.request_timeout:.0f}s")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()  # no restarts while the workers shut down
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._workers = []
+        super().stop()
+        self._block.close()
+        self._block.unlink()
+        self._block = None
+
+    @property
+    def ready(self):
+        """True once at least one worker process has loaded its model"""
+        return bool(self.startup_reports)
+
+    @property
+    def pending(self):
+        with self._inflight_lock:
+            return len(self._inflight)
+
+    def submit(self, building_id, frame):
+        request = InferenceRequest(building_id, None)
+        request_id = next(self._ids)
+
+        slot = None
+        if frame.dtype == np.uint8 and frame.nbytes <= self.slot_bytes:
+            try:
+                slot = self._free_slots.get(timeout=self.slot_wait)
+            except queue.Empty:
+                pass
+        if slot is not None:
+            np.copyto(slot_view(self._block, slot, self.slot_bytes, frame.shape), frame)
+            self.frames_copied += 1
+            task = (request_id, slot, frame.shape, None)
+        else:
+            self.frames_pickled += 1
+            task = (request_id, None, frame.shape, frame)
+
+        with self._inflight_lock:
+            # Least loaded worker, preferring ones whose model is loaded
+            worker = min(range(self.processes),
+                         key=lambda index: (index not in self.startup_reports, self._outstanding[index]))
+            self._outstanding[worker] += 1
+            self._inflight[request_id] = (request, slot, worker)
+            self._tasks[worker].put(task)
+        return request
+
+    def _run(self):
+        last_check = time.time()
+        while not self._stop.is_set():
+            if time.time() - last_check >= 1.0:
+                last_check = time.time()
+                self._expire_requests()
+                self._restart_dead_workers()
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            kind, index = message[0], message[1]
+            if kind == 'ready':
+                self.startup_reports[index] = message[2]
+                logger.info(f"Inference process {index} ready: {message[2]}")
+                continue
+            if kind == 'failed':
+                logger.error(f"Inference process {index} could not load the model: {message[2]}")
+                continue
+
+            _, _, start, elapsed, items = message
+            queue_wait = 0.0
+            for request_id, count, boxes, error in items:
+                with self._inflight_lock:
+                    entry = self._inflight.pop(request_id, None)
+                    if entry is not None:
+                        self._outstanding[entry[2]] -= 1
+                if entry is None:
+                    continue  # already expired, its slot is back in the ring
+                request, slot, _ = entry
+                if slot is not None:
+                    self._free_slots.put(slot)
+                if error is not None:
+                    request.set_error(RuntimeError(error))
+                else:
+                    request.set_result((count, boxes))
+                self.queue_wait.observe(start - request.submitted_at)
+                queue_wait += start - request.submitted_at
+
+            self.batch_latency.observe(elapsed)
+            self._record(len(items), elapsed, queue_wait)
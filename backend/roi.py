@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+
+
+def points_in_polygon(points, polygon):
+    """Vectorized even-odd ray casting: which of the (N, 2) points lie inside the (M, 2) polygon"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=np.float64)
+    if len(points) == 0:
+        return np.zeros(0, dtype=bool)
+
+    x, y = points[:, 0:1], points[:, 1:2]           # (N, 1)
+    x1, y1 = polygon[:, 0], polygon[:, 1]            # (M,)
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+    crosses = (y1 > y) != (y2 > y)                   # (N, M) edges spanning each point's row
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_intersect = (x2 - x1) * (y - y1) / (y2 - y1) + x1
+    return np.count_nonzero(crosses & (x < x_intersect), axis=1) % 2 == 1
+
+
+def map_boxes(boxes, scale, offset_x=0, offset_y=0):
+    """Map (N, 4) boxes from a resized crop back to full-frame pixel coordinates"""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if scale != 1.0:
+        boxes = boxes / scale
+    if offset_x or offset_y:
+        boxes = boxes + (offset_x, offset_y, offset_x, offset_y)
+    return boxes.astype(np.int32)
+
+
+class RegionOfInterest:
+    """A camera's monitored area as a polygon in normalized (0..1) x, y coordinates.
+
+    Inference only sees the polygon's bounding box, and detections whose
+    foot point (bottom centre of the box) falls outside the polygon are
+    dropped. Pixel geometry is cached per frame size.
+    """
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=np.float64)
+        if self.points.ndim != 2 or self.points.shape[1] != 2 or len(self.points) < 3:
+            raise ValueError("An ROI polygon needs at least three (x, y) points")
+        self._geometry = {}
+
+    def geometry(self, frame_shape):
+        """Pixel polygon and bounding box (x0, y0, x1, y1) for a frame size"""
+        height, width = frame_shape[:2]
+        geometry = self._geometry.get((height, width))
+        if geometry is None:
+            polygon = np.round(self.points * (width, height)).astype(np.int32)
+            x0, y0 = np.clip(polygon.min(axis=0), 0, (width, height))
+            x1, y1 = np.clip(polygon.max(axis=0), 0, (width, height))
+            geometry = (polygon, (int(x0), int(y0), int(x1), int(y1)))
+            self._geometry[(height, width)] = geometry
+        return geometry
+
+    def crop(self, frame):
+        """View (no copy) of the ROI's bounding box and its (x, y) offset in the frame"""
+        _, (x0, y0, x1, y1) = self.geometry(frame.shape)
+        return frame[y0:y1, x0:x1], (x0, y0)
+
+    def filter_boxes(self, boxes, frame_shape):
+        """Keep full-frame boxes whose bottom-centre point lies inside the polygon"""
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        polygon, _ = self.geometry(frame_shape)
+        feet = np.column_stack(((boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]))
+        return boxes[points_in_polygon(feet, polygon)]
+
+    def draw(self, frame, color=(255, 200, 0)):
+        """Outline the polygon on a frame"""
+        polygon, _ = self.geometry(frame.shape)
+        cv2.polylines(frame, [polygon.reshape(-1, 1, 2)], True, color, 1)
+        return frame
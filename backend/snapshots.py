@@ -0,0 +1,44 @@
+import json
+import threading
+import uuid
+
+
+class SerializedCache:
+    """JSON bodies of read-only endpoints, built at most once per snapshot version.
+
+    `snapshot` is any store whose `current()` returns (version, state) and
+    bumps the version on every change. Each registered builder turns a
+    state into a JSON-able object. `get()` returns (version, etag, body
+    bytes); the ETag embeds a per-process boot id so clients never match a
+    tag from before a restart.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._builders = {}
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def register(self, name, builder, live=None):
+        """`live()`, if given, returns a hashable value that changes outside the
+        snapshot (e.g. viewer counts); it is passed to the builder as a second
+        argument and a new value also rebuilds the body"""
+        self._builders[name] = (builder, live)
+
+    def get(self, name):
+        builder, live = self._builders[name]
+        version, state = self.snapshot.current()
+        key = (version, live() if live is not None else None)
+        cached = self._bodies.get(name)
+        if cached is None or cached[0] != key:
+            with self._lock:
+                cached = self._bodies.get(name)
+                if cached is None or cached[0] != key:
+                    value = builder(state) if live is None else builder(state, key[1])
+                    body = json.dumps(value, separators=(',', ':')).encode()
+                    self.builds += 1
+                    cached = (key, f"{self.boot_id}-{name}-{self.builds}", body)
+                    self._bodies[name] = cached
+        return cached[0][0], cached[1], cached[2]
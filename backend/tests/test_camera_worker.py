@@ -0,0 +1,54 @@
+import numpy as np
+
+from camera_worker import CameraWorker
+
+
+class FakeStream:
+    """A camera with frames always buffered and no stream timestamps"""
+
+    def __init__(self):
+        self.grabs = 0
+        self.retrieves = 0
+
+    def grab(self):
+        self.grabs += 1
+        return True
+
+    def retrieve(self):
+        self.retrieves += 1
+        return True, np.zeros((4, 4, 3), dtype=np.uint8)
+
+    def get(self, prop):
+        return 0.0
+
+
+def make_worker(wants):
+    return CameraWorker('b_1', 'rtsp://camera', lambda building_id, frame, index: (0, frame),
+                        supervisor=object(), capture_mode='latest', wants_frame=lambda building_id: wants)
+
+
+def test_unwanted_frame_is_grabbed_but_not_decoded():
+    worker, stream = make_worker(False), FakeStream()
+    assert worker._read_latest(stream, 0.0) == (True, None)
+    assert stream.grabs == 1
+    assert stream.retrieves == 0
+
+
+def test_requested_or_viewed_frame_is_decoded():
+    worker, stream = make_worker(False), FakeStream()
+    worker.request_frame()
+    success, frame = worker._read_latest(stream, 0.0)
+    assert success and frame is not None
+    # The request is one-shot
+    assert worker._read_latest(stream, 0.0) == (True, None)
+
+    worker._subscribers = 1
+    success, frame = worker._read_latest(stream, 0.0)
+    assert success and frame is not None
+    assert stream.retrieves == 2
+
+
+def test_frame_wanted_by_callback_is_decoded():
+    worker, stream = make_worker(True), FakeStream()
+    success, frame = worker._read_latest(stream, 0.0)
+    assert success and frame is not None
@@ -0,0 +1,33 @@
+import time
+
+import connection_supervisor
+from connection_supervisor import ConnectionSupervisor
+
+
+class FakeCapture:
+    def __init__(self, opened):
+        self.opened = opened
+
+    def isOpened(self):
+        return self.opened
+
+    def release(self):
+        pass
+
+
+def test_viewer_after_failed_probe_reopens_camera(monkeypatch):
+    camera_up = {'value': False}
+    monkeypatch.setattr(connection_supervisor, 'open_capture',
+                        lambda source, timeout_ms: FakeCapture(camera_up['value']))
+    supervisor = ConnectionSupervisor(base_delay=0.05, max_delay=0.05, jitter=0.0)
+
+    # The startup probe fails while no worker wants the camera...
+    supervisor.probe_all({'b_1': 'rtsp://camera'})
+    time.sleep(0.3)  # ...and its retry comes due and is skipped
+    assert supervisor.health()['b_1']['attempts'] == 1
+
+    # A viewer arrives once the camera is back
+    camera_up['value'] = True
+    cap = supervisor.acquire('b_1', 'rtsp://camera', timeout=2.0)
+    assert cap is not None
+    assert supervisor.state('b_1') == 'online'
@@ -0,0 +1,18 @@
+from crowd_state import CrowdStateStore
+
+
+def test_refresh_keeps_version_and_last_changed():
+    store = CrowdStateStore({'b_1': 100, 'b_2': 100})
+    store.update('b_1', count=5, status='online', timestamp=10.0)
+    version, snapshot = store.current()
+
+    store.update('b_1', count=5, status='online', timestamp=20.0)
+    assert store.current()[0] == version
+    assert store.get('b_1')['last_updated'] == 20.0
+    assert store.get('b_1', snapshot)['last_changed'] == 10.0
+
+    # Another camera's change re-copies the steady row; its last_changed still holds
+    store.update('b_2', count=3, status='online', timestamp=30.0)
+    version, snapshot = store.current()
+    assert store.get('b_1', snapshot)['last_updated'] == 20.0
+    assert store.get('b_1', snapshot)['last_changed'] == 10.0
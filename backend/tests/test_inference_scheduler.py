@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from inference_scheduler import InferenceScheduler
+
+
+@pytest.mark.parametrize("budget, cameras, heavy, weight", [(6.0, 40, 2, 10.0), (6.0, 40, 2, 50.0),
+                                                            (10.0, 31, 3, 100.0), (9.3, 31, 0, 1.0),
+                                                            (2.0, 4, 1, 10.0), (50.0, 5, 2, 10.0)])
+def test_allocation_stays_within_budget(budget, cameras, heavy, weight):
+    scheduler = InferenceScheduler(budget=budget, min_rate=0.2, max_rate=2.0)
+    weights = np.ones(cameras)
+    weights[:heavy] = weight
+
+    rates = scheduler._allocate(weights)
+
+    assert rates.sum() <= budget + 1e-9
+    assert (rates >= scheduler.effective_min_rate - 1e-9).all()
+    assert (rates <= scheduler.max_rate + 1e-9).all()
+    # Weighting still decides who gets more
+    if heavy and heavy < cameras:
+        assert rates[0] >= rates[-1]
+
+
+def test_minimums_over_budget_are_scaled_down():
+    scheduler = InferenceScheduler(budget=6.0, min_rate=0.2, max_rate=2.0)
+    rates = scheduler._allocate(np.ones(40))
+    assert scheduler.effective_min_rate < 0.2
+    assert rates.sum() == pytest.approx(6.0)
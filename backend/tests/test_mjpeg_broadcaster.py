@@ -0,0 +1,16 @@
+import pytest
+
+from mjpeg_broadcaster import DEFAULT_VARIANT, StreamVariant, stream_variant
+
+
+def test_limits_snap_down_to_shared_steps():
+    assert stream_variant(500, 7, 70) == StreamVariant(480, 5, 60)
+    assert stream_variant('500', '7', '70') == StreamVariant(480, 5, 60)
+    assert stream_variant() == DEFAULT_VARIANT
+
+
+@pytest.mark.parametrize("limits", [{'width': 100}, {'fps': 0}, {'quality': 10}, {'width': -320},
+                                    {'width': 'abc'}, {'fps': '2.5'}, {'quality': ''}])
+def test_malformed_or_too_small_limits_are_rejected(limits):
+    with pytest.raises(ValueError):
+        stream_variant(**limits)
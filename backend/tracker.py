@@ -0,0 +1,176 @@
+import numpy as np
+
+# Track state: box centre, width and height, and their velocities in px/s
+STATE_SIZE = 8
+_VELOCITY = np.zeros((STATE_SIZE, STATE_SIZE))
+_VELOCITY[np.arange(4), np.arange(4) + 4] = 1.0
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU of (N, 4) and (M, 4) x1, y1, x2, y2 boxes as an (N, M) array"""
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-6)
+
+
+def greedy_match(score, threshold):
+    """(track, detection) index pairs, best score first, each side used at most once"""
+    rows, columns = np.nonzero(score >= threshold)
+    order = np.argsort(-score[rows, columns], kind='stable')
+    used_rows, used_columns, matches = set(), set(), []
+    for row, column in zip(rows[order].tolist(), columns[order].tolist()):
+        if row not in used_rows and column not in used_columns:
+            used_rows.add(row)
+            used_columns.add(column)
+            matches.append((row, column))
+    return matches
+
+
+def _to_state(boxes):
+    centre = (boxes[:, :2] + boxes[:, 2:]) / 2
+    size = boxes[:, 2:] - boxes[:, :2]
+    return np.hstack([centre, size])
+
+
+def _to_boxes(state):
+    centre, size = state[:, :2], np.maximum(state[:, 2:4], 1.0)
+    return np.hstack([centre - size / 2, centre + size / 2])
+
+
+class PeopleTracker:
+    """SORT-style IoU + constant-velocity Kalman tracker for one camera.
+
+    `update()` takes the boxes of an inference, matches them to the
+    predicted tracks by IoU and corrects the matched tracks. Inferences can
+    be seconds apart, so tracks and detections left over are then matched
+    by centre distance, within `max_speed` box heights per second since the
+    track was last seen. Unmatched detections start tentative tracks, and
+    tracks missed by `max_misses` inferences in a row are dropped. `predict()` moves tracks
+    forward on frames where inference was skipped, for at most `max_coast`
+    seconds after a track was last seen. Prediction and correction run on
+    all tracks at once as batched numpy arrays.
+
+    The reported count is the number of confirmed tracks (matched by at
+    least `min_hits` inferences), so one-frame false positives and missed
+    detections no longer make the count jump.
+
+    Each camera has its own tracker, used only by that camera's worker thread.
+    """
+
+    def __init__(self, iou_threshold=0.3, min_hits=2, max_misses=2, max_coast=1.0, max_speed=1.0,
+                 position_noise=4.0, size_noise=8.0, velocity_noise=20.0):
+        self.iou_threshold = iou_threshold
+        self.max_speed = max_speed
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.max_coast = max_coast
+
+        # Measurement noise and the initial uncertainty of a new track
+        self._measurement = np.diag([position_noise ** 2] * 2 + [size_noise ** 2] * 2)
+        self._initial = np.diag([position_noise ** 2] * 2 + [size_noise ** 2] * 2 + [100.0 ** 2] * 4)
+        # Velocity random walk per second
+        self._process = np.diag([0.0] * 4 + [velocity_noise ** 2] * 4)
+
+        self._state = np.zeros((0, STATE_SIZE))
+        self._covariance = np.zeros((0, STATE_SIZE, STATE_SIZE))
+        self._hits = np.zeros(0, dtype=np.int32)
+        self._misses = np.zeros(0, dtype=np.int32)
+        self._seen_at = np.zeros(0)
+        self._time = None
+        self.updates = 0
+        self.tracks_created = 0
+
+    def predict(self, now):
+        """Move every track forward to `now` along its velocity"""
+        if self._time is None:
+            self._time = now
+            return
+        # Each track coasts from its last sighting for at most max_coast seconds
+        limit = self._seen_at + self.max_coast
+        dt = np.clip(np.minimum(now, limit) - np.minimum(self._time, limit), 0.0, None)
+        self._time = now
+        if not len(self._state) or not dt.any():
+            return
+
+        transition = np.eye(STATE_SIZE) + dt[:, None, None] * _VELOCITY
+        self._state = np.einsum('nij,nj->ni', transition, self._state)
+        self._covariance = (transition @ self._covariance @ transition.transpose(0, 2, 1)
+                            + dt[:, None, None] * self._process)
+
+    def update(self, boxes, now):
+        """Correct the tracks with an inference's (N, 4) boxes taken at `now`"""
+        self.predict(now)
+        self.updates += 1
+        detections = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+        matches = greedy_match(iou_matrix(_to_boxes(self._state), detections), self.iou_threshold)
+        matches += self._match_by_distance(matches, detections, now)
+        matched_tracks = np.array([track for track, _ in matches], dtype=np.intp)
+        matched_detections = np.array([detection for _, detection in matches], dtype=np.intp)
+
+        if len(matches):
+            # Batched Kalman correction; the measurement is the state's first four values
+            covariance = self._covariance[matched_tracks]
+            residual = _to_state(detections[matched_detections]) - self._state[matched_tracks, :4]
+            gain = covariance[:, :, :4] @ np.linalg.inv(covariance[:, :4, :4] + self._measurement)
+            self._state[matched_tracks] += np.einsum('nij,nj->ni', gain, residual)
+            self._covariance[matched_tracks] = covariance - gain @ covariance[:, :4, :]
+
+        missed = np.ones(len(self._state), dtype=bool)
+        missed[matched_tracks] = False
+        self._hits[matched_tracks] += 1
+        self._misses[matched_tracks] = 0
+        self._seen_at[matched_tracks] = now
+        self._misses[missed] += 1
+
+        keep = self._misses < self.max_misses
+        new = np.ones(len(detections), dtype=bool)
+        new[matched_detections] = False
+        new_count = int(new.sum())
+        self.tracks_created += new_count
+
+        self._state = np.vstack([self._state[keep],
+                                 np.hstack([_to_state(detections[new]), np.zeros((new_count, 4))])])
+        self._covariance = np.concatenate([self._covariance[keep],
+                                           np.repeat(self._initial[None], new_count, axis=0)])
+        self._hits = np.concatenate([self._hits[keep], np.ones(new_count, dtype=np.int32)])
+        self._misses = np.concatenate([self._misses[keep], np.zeros(new_count, dtype=np.int32)])
+        self._seen_at = np.concatenate([self._seen_at[keep], np.full(new_count, now)])
+
+    def _match_by_distance(self, matches, detections, now):
+        """Pairs of the tracks and detections IoU left unmatched, nearest first, within the speed gate"""
+        tracks = np.setdiff1d(np.arange(len(self._state)), [track for track, _ in matches])
+        unmatched = np.setdiff1d(np.arange(len(detections)), [detection for _, detection in matches])
+        if not len(tracks) or not len(unmatched):
+            return []
+
+        centres = _to_state(detections[unmatched])[:, :2]
+        distance = np.linalg.norm(self._state[tracks, None, :2] - centres[None], axis=2)
+        heights = np.maximum(self._state[tracks, 3], 1.0)
+        gate = heights * (0.5 + self.max_speed * (now - self._seen_at[tracks]))
+        closeness = 1.0 - distance / gate[:, None]
+        return [(int(tracks[track]), int(unmatched[detection]))
+                for track, detection in greedy_match(closeness, 0.0)]
+
+    def _confirmed(self):
+        # Until min_hits inferences have run, nothing could be confirmed yet
+        if self.updates < self.min_hits:
+            return np.ones(len(self._hits), dtype=bool)
+        return self._hits >= self.min_hits
+
+    @property
+    def count(self):
+        return int(self._confirmed().sum())
+
+    @property
+    def active_tracks(self):
+        return len(self._state)
+
+    def boxes(self):
+        """(N, 4) int32 x1, y1, x2, y2 boxes of the confirmed tracks"""
+        return _to_boxes(self._state[self._confirmed()]).round().astype(np.int32)